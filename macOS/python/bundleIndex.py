@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Persistent index of the installed applications, CFBundleIdentifier -> application path(s) and version.
+
+The index file keeps, next to the applications, every directory of the walk with its mtime and subdirectory names.
+The walk goes through the directories holding applications, never inside an application, the nested helper bundles
+are left to LaunchServices, so the directories are the ones of /Applications and the like, not of the bundles.
+- a directory whose mtime did not change is not listed again, its recorded subdirectories are used, one stat call
+- a bundle whose Info.plist mtime and size did not change is not read again
+- the changed Info.plist files are read by a thread pool, only the keys the index keeps are decoded (plistKeys)
+so a refresh costs a stat per directory and per application, and the reading of the bundles which were added or updated.
+Directories and bundles the walk does not reach anymore are dropped.
+A lookup stats the Info.plist of the applications it answers with, one which changed is read again, one which is gone
+is dropped.
+
+Only the filesystem is used, it runs anywhere, on a fixture tree as well as on /Applications.
+--check indexes a copy of the bundleScan fixture tree and compares the lookups with its expected.json, then changes,
+adds, removes and renames applications in it, checking what each refresh lists and reads and what the lookups answer.
+
+	python3 bundleIndex.py [-i indexFile] [root ...]
+	python3 bundleIndex.py --check [fixturesDirectory]
+"""
+import argparse, json, os, plistlib, shutil, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple
+from bundleScan import FIXTURES_DIR, SCAN_ROOTS, SCAN_WORKERS, bundleRecord, infoPlistPath, subdirectories
+
+INDEX_VERSION = 2
+INDEX_PATH = os.path.expanduser('~/Library/Caches/bundleIndex/bundleIndex.json')
+INDEX_ROOTS = SCAN_ROOTS + ( '/System/Applications', )
+INDEX_KEYS = ( 'CFBundleIdentifier', 'CFBundleShortVersionString', 'CFBundleVersion' )
+
+class refreshStats(NamedTuple):
+	directories: int
+	# directories listed with scandir, the others had not changed
+	listed: int
+	bundles: int
+	# Info.plist files read, the others had not changed
+	read: int
+	seconds: float
+
+def indexEntry(st: os.stat_result, record: dict) -> dict:
+	# an unreadable Info.plist is kept with no keys, it is read again once it changes
+	return { 'mtime': st.st_mtime_ns, 'size': st.st_size, **{ key: record.get(key) for key in INDEX_KEYS } }
+
+class bundleIndex:
+	def __init__(self, path: str = INDEX_PATH):
+		self.path = path
+		# directory -> { 'mtime': st_mtime_ns, 'subdirs': [names] }
+		self.dirs = {}
+		# application path -> { 'mtime': Info.plist st_mtime_ns, 'size': Info.plist st_size, CFBundleIdentifier ... }
+		self.bundles = {}
+		self.byID = {}
+	def load(self) -> 'bundleIndex':
+		# an index file which is missing, unreadable or from another version is an empty index
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				index = json.load(f)
+		except (OSError, ValueError):
+			index = {}
+		if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+			index = {}
+		self.dirs = index.get('dirs', {})
+		self.bundles = index.get('bundles', {})
+		self.reindex()
+		return self
+	def save(self) -> None:
+		# written next to the target then renamed over it, a concurrent run never reads half a file
+		directory = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(directory, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.bundleIndex.')
+		try:
+			with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+				json.dump({ 'version': INDEX_VERSION, 'dirs': self.dirs, 'bundles': self.bundles }, tmp, ensure_ascii=False)
+			os.replace(tmp_path, self.path)
+		except BaseException:
+			os.unlink(tmp_path)
+			raise
+	def reindex(self) -> None:
+		self.byID = {}
+		for appPath, bundle in self.bundles.items():
+			if bundle.get('CFBundleIdentifier') is not None:
+				self.byID.setdefault(bundle['CFBundleIdentifier'], []).append(appPath)
+	def walk(self, roots: Iterable[str]) -> tuple:
+		# ( directories, application path -> Info.plist stat, directories listed )
+		dirs = {}
+		bundles = {}
+		listed = 0
+		stack = [os.path.expanduser(root) for root in reversed(list(roots))]
+		while stack:
+			path = stack.pop()
+			if path in dirs:
+				continue
+			try:
+				mtime = os.stat(path).st_mtime_ns
+				known = self.dirs.get(path)
+				if known is not None and known['mtime'] == mtime:
+					subdirs = known['subdirs']
+				else:
+					subdirs = subdirectories(path)
+					listed += 1
+			except OSError:
+				continue
+			dirs[path] = { 'mtime': mtime, 'subdirs': subdirs }
+			children = []
+			for child in ( os.path.join(path, name) for name in subdirs ):
+				if child.endswith('.app'):
+					try:
+						bundles[child] = os.stat(infoPlistPath(child))
+						# an application, the walk does not go inside it
+						continue
+					except OSError:
+						# not an application, a directory like any other
+						pass
+				children.append(child)
+			stack += reversed(children)
+		return dirs, bundles, listed
+	def refresh(self, roots: Iterable[str] = INDEX_ROOTS, workers: int = SCAN_WORKERS) -> refreshStats:
+		start = time.perf_counter()
+		dirs, found, listed = self.walk(roots)
+		bundles = {}
+		changed = []
+		for appPath, st in found.items():
+			known = self.bundles.get(appPath)
+			if known is not None and known['mtime'] == st.st_mtime_ns and known['size'] == st.st_size:
+				bundles[appPath] = known
+			else:
+				changed.append(( appPath, st ))
+		if changed:
+			with ThreadPoolExecutor(max_workers=max(1, min(workers, len(changed)))) as executor:
+				records = executor.map(lambda appPath: bundleRecord(appPath, INDEX_KEYS), [appPath for appPath, _ in changed])
+				for ( appPath, st ), record in zip(changed, records):
+					bundles[appPath] = indexEntry(st, record)
+		self.dirs = dirs
+		self.bundles = bundles
+		self.reindex()
+		return refreshStats(len(dirs), listed, len(bundles), len(changed), time.perf_counter() - start)
+	def validate(self, appPath: str) -> dict:
+		# the index entry of appPath once its Info.plist was stat-ed, read again when it changed, None when it is gone
+		known = self.bundles[appPath]
+		try:
+			st = os.stat(infoPlistPath(appPath))
+		except OSError:
+			del self.bundles[appPath]
+			self.byID[known['CFBundleIdentifier']].remove(appPath)
+			return None
+		if known['mtime'] != st.st_mtime_ns or known['size'] != st.st_size:
+			entry = self.bundles[appPath] = indexEntry(st, bundleRecord(appPath, INDEX_KEYS))
+			if entry['CFBundleIdentifier'] != known['CFBundleIdentifier']:
+				self.byID[known['CFBundleIdentifier']].remove(appPath)
+				if entry['CFBundleIdentifier'] is not None:
+					self.byID.setdefault(entry['CFBundleIdentifier'], []).append(appPath)
+				return None
+			return entry
+		return known
+	def lookup(self, bundleID: str) -> list:
+		# { 'path', 'version' } of every application with that CFBundleIdentifier, in path order
+		apps = []
+		for appPath in sorted(self.byID.get(bundleID, ())):
+			entry = self.validate(appPath)
+			if entry is not None:
+				apps.append({ 'path': appPath, 'version': entry.get('CFBundleShortVersionString') })
+		return apps
+	def lookupMany(self, bundleIDs: Iterable[str]) -> dict:
+		return { bundleID: self.lookup(bundleID) for bundleID in bundleIDs }
+
+def touch(path: str) -> None:
+	# a second later than its mtime, a change is seen whatever the filesystem timestamp resolution
+	st = os.stat(path)
+	os.utime(path, ns=( st.st_atime_ns, st.st_mtime_ns + 1000000000 ))
+
+def writeInfoPlist(appPath: str, info: dict) -> None:
+	os.makedirs(os.path.join(appPath, 'Contents'), exist_ok=True)
+	with open(infoPlistPath(appPath), 'wb') as f:
+		plistlib.dump(info, f)
+	touch(infoPlistPath(appPath))
+
+def checkFixtures(directory: str = FIXTURES_DIR) -> int:
+	# number of steps checked, AssertionError on the first refresh or lookup which differs from what is expected
+	with open(os.path.join(directory, 'expected.json'), 'r', encoding='utf-8') as f:
+		expected = json.load(f)
+	with tempfile.TemporaryDirectory() as tmp:
+		tree = os.path.join(tmp, 'tree')
+		shutil.copytree(directory, tree, symlinks=True)
+		roots = [os.path.join(tree, root) for root in expected['roots']]
+		indexPath = os.path.join(tmp, 'bundleIndex.json')
+		def lookups(index: bundleIndex, bundleIDs: Iterable[str]) -> dict:
+			return { bundleID: [{ **app, 'path': os.path.relpath(app['path'], tree) } for app in apps] for bundleID, apps in index.lookupMany(bundleIDs).items() }
+		def step(index: bundleIndex, listed: int, read: int, bundles: int) -> None:
+			stats = index.refresh(roots)
+			assert ( stats.listed, stats.read, stats.bundles ) == ( listed, read, bundles ), f'refresh gave {stats}, expected {listed} listed, {read} read, {bundles} applications'
+		steps = 0
+		# first run, every directory listed and every Info.plist read, the lookups are the expected ones
+		index = bundleIndex(indexPath).load()
+		stats = index.refresh(roots)
+		assert stats.listed == stats.directories and stats.read == stats.bundles == expected['indexed'], f'first refresh gave {stats}'
+		assert lookups(index, expected['index']) == expected['index'], f'lookups gave {lookups(index, expected["index"])!r}'
+		index.save()
+		steps += 1
+		# reloaded from the file, nothing changed, nothing listed or read
+		index = bundleIndex(indexPath).load()
+		step(index, 0, 0, expected['indexed'])
+		assert lookups(index, expected['index']) == expected['index'], 'lookups changed after a reload'
+		steps += 1
+		# an updated application, its Info.plist alone is read again
+		terminal = os.path.join(tree, 'Applications/Utilities/Terminal.app')
+		writeInfoPlist(terminal, { 'CFBundleIdentifier': 'com.apple.Terminal', 'CFBundleShortVersionString': '2.14' })
+		step(index, 0, 1, expected['indexed'])
+		assert lookups(index, [ 'com.apple.Terminal' ])['com.apple.Terminal'] == [{ 'path': 'Applications/Utilities/Terminal.app', 'version': '2.14' }]
+		steps += 1
+		# updated, then looked up before any refresh, the lookup reads it again
+		vlc = os.path.join(tree, 'Applications/VLC.app')
+		writeInfoPlist(vlc, { 'CFBundleIdentifier': 'org.videolan.vlc', 'CFBundleShortVersionString': '3.0.21' })
+		assert lookups(index, [ 'org.videolan.vlc' ])['org.videolan.vlc'][1] == { 'path': 'Applications/VLC.app', 'version': '3.0.21' }
+		step(index, 0, 0, expected['indexed'])
+		steps += 1
+		# an added application, its directory is listed again
+		writeInfoPlist(os.path.join(tree, 'Applications/Utilities/Added.app'), { 'CFBundleIdentifier': 'com.example.added', 'CFBundleShortVersionString': '1.0' })
+		touch(os.path.join(tree, 'Applications/Utilities'))
+		step(index, 1, 1, expected['indexed'] + 1)
+		assert lookups(index, [ 'com.example.added' ])['com.example.added'] == [{ 'path': 'Applications/Utilities/Added.app', 'version': '1.0' }]
+		steps += 1
+		# a removed application, gone from the lookups right away, from the index at the next refresh
+		shutil.rmtree(os.path.join(tree, 'Applications/Old Versions/VLC 2.app'))
+		assert [app['path'] for app in lookups(index, [ 'org.videolan.vlc' ])['org.videolan.vlc']] == [ 'Applications/VLC.app' ]
+		touch(os.path.join(tree, 'Applications/Old Versions'))
+		step(index, 1, 0, expected['indexed'])
+		steps += 1
+		# an identifier change, the old one no longer answers with it
+		inside = os.path.join(tree, 'Applications/Downloads.app/Inside.app')
+		writeInfoPlist(inside, { 'CFBundleIdentifier': 'com.example.renamed', 'CFBundleShortVersionString': '0.2' })
+		assert lookups(index, [ 'com.example.inside', 'com.example.renamed' ]) == { 'com.example.inside': [], 'com.example.renamed': [{ 'path': 'Applications/Downloads.app/Inside.app', 'version': '0.2' }] }
+		step(index, 0, 0, expected['indexed'])
+		steps += 1
+	return steps
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Refreshes the CFBundleIdentifier -> application path index')
+	parser.add_argument('roots', nargs='*', default=list(INDEX_ROOTS), metavar='root', help='directory to index, /Applications, ~/Applications and /System/Applications by default')
+	parser.add_argument('-i', '--index', default=INDEX_PATH, help='index file')
+	parser.add_argument('--check', nargs='?', const=FIXTURES_DIR, metavar='fixturesDirectory', help='refresh and query an index of a copy of the fixture tree')
+	args = parser.parse_args(argv[1:])
+	if args.check:
+		print(f'{checkFixtures(args.check)} index refresh steps: ok')
+		return
+	index = bundleIndex(args.index).load()
+	stats = index.refresh(args.roots)
+	index.save()
+	print(f'{stats.directories} directories ({stats.listed} listed), {stats.bundles} applications ({stats.read} read), '
+		f'{len(index.byID)} bundle identifiers in {stats.seconds * 1000:.1f} ms', file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Bulk inventory of the macOS applications under one or more directories, streamed out as NDJSON.
+
+- the directories are walked with os.scandir, symbolic links are not followed, every *.app directory holding a
+  Contents/Info.plist is an application, the walk goes on inside it so nested helper and login item bundles
+  (Contents/Library/LoginItems, Contents/Frameworks/.../Helpers ...) are found too
+- the Info.plist files are read and parsed by a thread pool (getCFBundleIdentifier.bundleKeys), while the walk goes on,
+  at most SCAN_WINDOW of them in flight
+- only the requested keys are kept, every application is written as one JSON line
+  { "path": ..., "CFBundleIdentifier": ..., "CFBundleShortVersionString": ..., ... } in the walk order,
+  an Info.plist which could not be read or parsed gets an "error" member instead
+
+Only the filesystem is used, it runs anywhere, on a fixture tree as well as on /Applications.
+bundleFixtures is such a tree, XML and binary Info.plist files, helper bundles nested in an application, a directory named
+.app which is not one, the same identifier twice, an Info.plist which is not a property list, with in expected.json the
+records a scan of its roots gives. --check scans it and compares.
+
+	python3 bundleScan.py [-k KEY ...] [-j workers] [root ...]
+	python3 bundleScan.py --check [fixturesDirectory]
+"""
+import argparse, json, os, sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, TextIO
+from getCFBundleIdentifier import bundleKeys, infoPlistPath
+
+SCAN_ROOTS = ( '/Applications', '~/Applications' )
+SCAN_KEYS = ( 'CFBundleIdentifier', 'CFBundleShortVersionString', 'CFBundleVersion', 'CFBundleExecutable' )
+SCAN_WORKERS = 8
+# Info.plist reads submitted ahead of the one being written out, per worker
+SCAN_WINDOW = 4
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bundleFixtures')
+# bundle directories which never hold another bundle
+SKIPPED_DIRS = ( '_CodeSignature', '_MASReceipt' )
+
+def subdirectories(path: str) -> list:
+	# names of the directories the walk goes into, sorted, symbolic links left out, OSError when path is unreadable
+	with os.scandir(path) as entries:
+		return sorted(entry.name for entry in entries if entry.is_dir(follow_symlinks=False)
+					and entry.name not in SKIPPED_DIRS and not entry.name.endswith('.lproj'))
+
+def isBundle(path: str) -> bool:
+	return path.endswith('.app') and os.path.isfile(infoPlistPath(path))
+
+def iterBundles(roots: Iterable[str]) -> Iterator[str]:
+	# application paths, depth first, each root in turn, unreadable directories are skipped
+	for root in roots:
+		stack = [os.path.expanduser(root)]
+		while stack:
+			path = stack.pop()
+			try:
+				dirs = [os.path.join(path, name) for name in subdirectories(path)]
+			except OSError:
+				continue
+			yield from filter(isBundle, dirs)
+			# popped in name order
+			stack += reversed(dirs)
+
+def bundleRecord(appPath: str, keys: Iterable[str]) -> dict:
+	try:
+		return { 'path': appPath, **bundleKeys(appPath, keys) }
+	except Exception as e:
+		# unreadable, or not a property list
+		return { 'path': appPath, 'error': f'{type(e).__name__}: {e}' }
+
+def scanBundles(roots: Iterable[str] = SCAN_ROOTS, keys: Iterable[str] = SCAN_KEYS, workers: int = SCAN_WORKERS) -> Iterator[dict]:
+	keys = list(keys)
+	pending = deque()
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		for appPath in iterBundles(roots):
+			pending.append(executor.submit(bundleRecord, appPath, keys))
+			if len(pending) >= workers * SCAN_WINDOW:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+def jsonValue(value):
+	# property list values JSON has no type for, dates and data
+	return value.isoformat() if hasattr(value, 'isoformat') else value.hex() if isinstance(value, bytes) else str(value)
+
+def streamBundles(records: Iterable[dict], out: TextIO = sys.stdout) -> int:
+	count = 0
+	for record in records:
+		out.write(json.dumps(record, default=jsonValue) + '\n')
+		count += 1
+	out.flush()
+	return count
+
+def checkFixtures(directory: str = FIXTURES_DIR) -> int:
+	# number of applications checked, AssertionError on the first scan which differs from expected.json
+	with open(os.path.join(directory, 'expected.json'), 'r', encoding='utf-8') as f:
+		expected = json.load(f)
+	roots = [os.path.join(directory, root) for root in expected['roots']]
+	for workers in ( 1, SCAN_WORKERS ):
+		# paths relative to the fixture tree, wherever it sits
+		records = [{ **record, 'path': os.path.relpath(record['path'], directory) } for record in scanBundles(roots, SCAN_KEYS, workers)]
+		assert records == expected['scan'], f'scan with {workers} workers gave {records!r}, expected {expected["scan"]!r}'
+	return len(expected['scan'])
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Lists the applications under the roots with their Info.plist keys, as NDJSON')
+	parser.add_argument('roots', nargs='*', default=list(SCAN_ROOTS), metavar='root', help='directory to scan, /Applications and ~/Applications by default')
+	parser.add_argument('-k', '--key', action='append', dest='keys', metavar='KEY', help='Info.plist key to extract, may be repeated')
+	parser.add_argument('-j', '--workers', type=int, default=SCAN_WORKERS, help='Info.plist reader threads')
+	parser.add_argument('--check', nargs='?', const=FIXTURES_DIR, metavar='fixturesDirectory', help='scan the fixture tree and compare with its expected.json')
+	args = parser.parse_args(argv[1:])
+	if args.check:
+		print(f'{checkFixtures(args.check)} fixture applications: ok')
+		return
+	streamBundles(scanBundles(args.roots, args.keys or SCAN_KEYS, args.workers))
+
+if __name__ == '__main__':
+    main(sys.argv)
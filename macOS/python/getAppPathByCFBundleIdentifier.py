@@ -8,23 +8,70 @@ com.docker.docker
 org.videolan.vlc
 com.microsoft.rdc.macos
 
-This program requires the pyobjc-Framework-Cocoa module
+Several identifiers can be looked up at once, they are answered from the bundleIndex.py index, refreshed first (only the
+directories and bundles which changed are looked at again), LaunchServices is only asked about the identifiers the index
+does not have. With a single identifier its path is printed, with several one JSON line per identifier
+{ "CFBundleIdentifier": ..., "path": ..., "version": ... }, "path" is null for the ones not found.
+
+	python3 getAppPathByCFBundleIdentifier.py CFBundleIdentifier [CFBundleIdentifier ...]
+
+The LaunchServices fallback requires the pyobjc-Framework-Cocoa module
 """
 
+import json
+import os
 import sys
-from AppKit import NSWorkspace
+from bundleIndex import bundleIndex
+from getCFBundleIdentifier import bundleKeys, infoPlistPath
+
+def launchServicesPath(bundleID: str) -> str:
+	# imported on a miss only, AppKit takes longer to import than the whole index lookup
+	from AppKit import NSWorkspace
+	appURL = NSWorkspace.sharedWorkspace().URLForApplicationWithBundleIdentifier_(bundleID)
+	return appURL.path() if appURL else None
+
+def lookupApps(bundleIDs, index: bundleIndex = None, fallback = launchServicesPath) -> dict:
+	# CFBundleIdentifier -> { 'path', 'version' } of the first application found, None for the ones not found
+	if index is None:
+		index = bundleIndex().load()
+		index.refresh()
+		try:
+			index.save()
+		except OSError:
+			# a read-only home is not a reason not to answer
+			pass
+	results = {}
+	for bundleID, apps in index.lookupMany(bundleIDs).items():
+		if apps:
+			results[bundleID] = apps[0]
+			continue
+		appPath = fallback(bundleID) if fallback is not None else None
+		if appPath is None:
+			results[bundleID] = None
+			continue
+		version = None
+		if os.path.isfile(infoPlistPath(appPath)):
+			version = bundleKeys(appPath, ['CFBundleShortVersionString'])['CFBundleShortVersionString']
+		results[bundleID] = { 'path': appPath, 'version': version }
+	return results
 
 def main(argv):
-	if len(argv) != 2:
-		sys.exit('usage: {0} CFBundleIdentifier'.format(argv[0]))
+	if len(argv) < 2:
+		sys.exit('usage: {0} CFBundleIdentifier [CFBundleIdentifier ...]'.format(argv[0]))
 
-	appURL = NSWorkspace.sharedWorkspace().URLForApplicationWithBundleIdentifier_(argv[1])
+	results = lookupApps(argv[1:])
 
-	if appURL:
-		print(appURL.path())
+	if len(argv) == 2:
+		if results[argv[1]]:
+			print(results[argv[1]]['path'])
+		else:
+			sys.exit('This CFBundleIdentifier has not been detected on this computer')
+		return
 
-	else:
-		sys.exit('This CFBundleIdentifier has not been detected on this computer')
+	for bundleID, app in results.items():
+		print(json.dumps({ 'CFBundleIdentifier': bundleID, 'path': None, 'version': None, **(app or {}) }))
+	if not all(results.values()):
+		sys.exit(1)
 
 if __name__ == '__main__':
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
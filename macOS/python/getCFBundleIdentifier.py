@@ -7,23 +7,33 @@ macOS applications store this information in [APPLICATION_PATH]/Contents/Info.pl
 Here is an example of APPLICATION_PATH : /Applications/VLC.app 
 
 You need this information in order detect the presence of an application on other machines
+
+bundleScan.py does the same for every application under one or more directories, in a single run
 """
 import os
 import sys
-import plistlib
+from plistKeys import readPlistKeys
+
+INFO_PLIST = 'Contents/Info.plist'
+
+def infoPlistPath(appPath: str) -> str:
+	return os.path.join(appPath, INFO_PLIST)
+
+def bundleKeys(appPath: str, keys) -> dict:
+	# key -> value from the application Info.plist, None for the keys it does not have,
+	# only these keys are decoded, not the icons or localized tables some Info.plist embed
+	keys = list(keys)
+	d = readPlistKeys(infoPlistPath(appPath), keys)
+	return { key: d.get(key, None) for key in keys }
 
 def main(argv):
 	if len(argv) != 2:
 		sys.exit('usage: {0} applicationPath'.format(argv[0]))
 
-	plistPath = os.path.join(argv[1], 'Contents/Info.plist')
-
-	if not os.path.isfile(plistPath):
+	if not os.path.isfile(infoPlistPath(argv[1])):
 		sys.exit('FATAL: This path does not contain a macOS application')
 
-	with open(plistPath, 'rb') as plist:
-		d = plistlib.loads(plist.read())
-		print(d.get('CFBundleIdentifier', None))
+	print(bundleKeys(argv[1], ['CFBundleIdentifier'])['CFBundleIdentifier'])
 
 if __name__ == '__main__':
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
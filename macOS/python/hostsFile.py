@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Hosts file handling for the F5 SVPN cleanup, sized for hosts files carrying 100k+ blocklist lines.
+
+SVPN copies the hosts file to a backup (/private/etc/.hosts.bkp) and writes its own entries into the live one.
+
+- restoreHostsFile moves the backup over the hosts file with a single rename, there is never a moment without a hosts file
+- injectedEntries streams the current file and reports the lines the backup does not have, the entries SVPN injected
+- stripInjectedEntries writes the current file minus those lines to a temporary file next to it, then renames it over
+
+Files are read through mmap and split with C level finds, the backup is only kept as a set of 8 bytes line digests,
+so memory use depends on the number of distinct backup lines and never on the size of the text.
+Every function takes its paths as arguments, nothing here is specific to /private/etc.
+
+	python3 hostsFile.py /private/etc/.hosts.bkp /private/etc/hosts
+"""
+import hashlib, mmap, os, sys, tempfile
+from typing import Iterator, NamedTuple
+
+class hostsEntry(NamedTuple):
+	# 1 based line number in the current file
+	line: int
+	text: str
+
+def iterLines(path: str) -> Iterator[bytes]:
+	with open(path, 'rb') as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			return
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			start = 0
+			end = len(mm)
+			while start < end:
+				nl = mm.find(b'\n', start)
+				stop = end if nl < 0 else nl + 1
+				yield mm[start:stop]
+				start = stop
+
+def lineDigest(line: bytes) -> bytes:
+	# trailing spaces and line endings do not make an entry different
+	return hashlib.blake2b(line.rstrip(), digest_size=8).digest()
+
+def lineDigests(path: str) -> set:
+	return { lineDigest(line) for line in iterLines(path) }
+
+def injectedEntries(backup_path: str, hosts_path: str) -> Iterator[hostsEntry]:
+	known = lineDigests(backup_path)
+	for n, line in enumerate(iterLines(hosts_path), 1):
+		if line.strip() and lineDigest(line) not in known:
+			yield hostsEntry(n, line.rstrip().decode('utf-8', errors='replace'))
+
+def replaceFile(path: str, lines: Iterator[bytes]) -> None:
+	# written next to the target so the final rename stays on the same filesystem, and therefore atomic
+	st = os.stat(path)
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.hosts.')
+	try:
+		with os.fdopen(fd, 'wb') as tmp:
+			for line in lines:
+				tmp.write(line)
+			tmp.flush()
+			os.fsync(tmp.fileno())
+		os.chmod(tmp_path, st.st_mode & 0o7777)
+		if os.getuid() == 0:
+			os.chown(tmp_path, st.st_uid, st.st_gid)
+		os.replace(tmp_path, path)
+	except BaseException:
+		os.unlink(tmp_path)
+		raise
+
+def stripInjectedEntries(backup_path: str, hosts_path: str) -> int:
+	# one pass over the current file, the lines also present in the backup are kept in their current order
+	known = lineDigests(backup_path)
+	stripped = 0
+	def kept() -> Iterator[bytes]:
+		nonlocal stripped
+		for line in iterLines(hosts_path):
+			if line.strip() and lineDigest(line) not in known:
+				stripped += 1
+				continue
+			yield line
+	replaceFile(hosts_path, kept())
+	return stripped
+
+def restoreHostsFile(backup_path: str, hosts_path: str) -> None:
+	os.replace(backup_path, hosts_path)
+
+def main(argv):
+	if len(argv) != 3:
+		sys.exit('usage: {0} backupHostsFile currentHostsFile'.format(argv[0]))
+	for entry in injectedEntries(argv[1], argv[2]):
+		print(f'{entry.line}: {entry.text}')
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Interface reset (down then up) for the F5 SVPN cleanup, every interface at once and confirmed by the kernel.
+
+Instead of a blocking down / sleep / up per interface, ifaceReset
+
+- clears IFF_UP on every target interface, back to back
+- polls SIOCGIFFLAGS until each of them reads down, or the deadline passes
+- sets IFF_UP on every interface it cleared IFF_UP on, back to back, whether the down state was confirmed or not
+- polls until each of them reads IFF_UP and IFF_RUNNING, or the deadline passes
+- reports a per-interface result with the time each transition took to be confirmed
+
+Polling starts at a millisecond and backs off, interfaces already confirmed are not asked again.
+Every ioctl goes through one AF_INET control socket, opened once.
+
+The ioctls sit behind a small backend interface
+- socketIoctlBackend, the live SIOCGIFFLAGS / SIOCSIFFLAGS calls, it requires root to change flags
+- fakeIoctlBackend, in-memory interfaces with a configurable transition latency, for unit tests and benchmarks on any platform
+
+	sudo python3 ifaceReset.py en0 utun3
+"""
+import abc, ctypes, errno, fcntl, socket, sys, time
+from typing import Iterable, NamedTuple
+
+IF_NAMESIZE = 16
+# SIOCGIFFLAGS, a 4-byte wide command
+# Byte 3 : 0xc0 for 'COPY PARAMETERS OUT' (0x40) + 'COPY PARAMETERS IN' (0x80)
+# Byte 2 : 0x20 aka 32 for the size of struct ifreq
+# Byte 1 : 0x69 aka 105 for ASCII 'i', meaning IO controls, there are 's' aka socket controls ...
+# Byte 0 : 0x11 aka 17 for GET IFNET FLAGS
+SIOCGIFFLAGS = 0xc0206911
+# SIOCSIFFLAGS, a 4-byte wide command
+# Byte 3 : 0x80 for 'COPY PARAMETERS IN'
+# Byte 2 : 0x20 aka 32 for the size of struct ifreq
+# Byte 1 : 0x69 aka 105 for ASCII 'i', meaning IO controls, there are 's' aka socket controls ...
+# Byte 0 : 0x10 aka 16 for SET IFNET FLAGS
+SIOCSIFFLAGS = 0x80206910
+
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+
+POLL_FIRST_INTERVAL = .001
+POLL_MAX_INTERVAL = .02
+
+class ifreq_ifflags(ctypes.Structure):
+	# padded to the full 32 bytes struct ifreq the ioctl commands encode
+	_fields_ = [("ifr_name", ctypes.c_char * IF_NAMESIZE),
+				("ifru_flags", ctypes.c_ushort),
+				("ifru_pad", ctypes.c_char * 14)]
+
+class ifaceResetResult(NamedTuple):
+	name: str
+	ok: bool
+	# seconds from the SIOCSIFFLAGS call until the new state was read back, None when never confirmed
+	down: float
+	up: float
+	# an ioctl errno, ETIMEDOUT when a transition was not confirmed before the deadline
+	errno: int
+	# the same for the down state, the interface was brought up again all the same
+	downErrno: int = 0
+
+class ifaceIoctlBackend(abc.ABC):
+	@abc.abstractmethod
+	def getFlags(self, name: str) -> int:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def setFlags(self, name: str, flags: int) -> None:
+		raise NotImplementedError
+	def close(self) -> None:
+		pass
+
+class socketIoctlBackend(ifaceIoctlBackend):
+	def __init__(self):
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	def getFlags(self, name: str) -> int:
+		ifreq = ifreq_ifflags(bytes(name, 'utf-8'), 0)
+		return ifreq_ifflags.from_buffer_copy(fcntl.ioctl(self.sock.fileno(), SIOCGIFFLAGS, bytes(ifreq))).ifru_flags
+	def setFlags(self, name: str, flags: int) -> None:
+		fcntl.ioctl(self.sock.fileno(), SIOCSIFFLAGS, bytes(ifreq_ifflags(bytes(name, 'utf-8'), flags)))
+	def close(self) -> None:
+		self.sock.close()
+
+class fakeIoctlBackend(ifaceIoctlBackend):
+	def __init__(self, flags: dict, latency = 0.):
+		# name -> flags, latency is a number of seconds or a name -> seconds dictionary
+		self.flags = dict(flags)
+		self.latency = latency
+		# name -> ( flags, monotonic time they apply from )
+		self.scheduled = {}
+		self.calls = 0
+	def getFlags(self, name: str) -> int:
+		self.calls += 1
+		if name not in self.flags:
+			raise OSError(errno.ENXIO, 'Device not configured')
+		if name in self.scheduled and self.scheduled[name][1] <= time.monotonic():
+			self.flags[name] = self.scheduled.pop(name)[0]
+		return self.flags[name]
+	def setFlags(self, name: str, flags: int) -> None:
+		self.calls += 1
+		if name not in self.flags:
+			raise OSError(errno.ENXIO, 'Device not configured')
+		# the driver follows IFF_UP with IFF_RUNNING after a while
+		flags = flags | IFF_RUNNING if flags & IFF_UP else flags & ~IFF_RUNNING
+		latency = self.latency.get(name, 0.) if isinstance(self.latency, dict) else self.latency
+		self.scheduled[name] = ( flags, time.monotonic() + latency )
+
+class ifaceReset:
+	def __init__(self, backend: ifaceIoctlBackend, timeout: float = 2.0):
+		self.backend = backend
+		self.timeout = timeout
+	def transition(self, names: Iterable[str], up: bool, failed: dict, unconfirmed: dict) -> tuple:
+		# ( names whose flags were set, name -> seconds until confirmed ), the errors of the ioctl setting the flags are
+		# put in failed, the ones of the confirmation (a failed poll, the deadline) in unconfirmed
+		started = {}
+		for name in names:
+			try:
+				flags = self.backend.getFlags(name)
+				self.backend.setFlags(name, flags | IFF_UP if up else flags & ~IFF_UP)
+			except OSError as e:
+				failed[name] = e.errno
+				continue
+			started[name] = time.monotonic()
+		wanted = IFF_UP | IFF_RUNNING if up else IFF_UP
+		expected = wanted if up else 0
+		confirmed = {}
+		waiting = list(started)
+		deadline = time.monotonic() + self.timeout
+		interval = POLL_FIRST_INTERVAL
+		while waiting:
+			still_waiting = []
+			for name in waiting:
+				try:
+					flags = self.backend.getFlags(name)
+				except OSError as e:
+					unconfirmed[name] = e.errno
+					continue
+				if flags & wanted == expected:
+					confirmed[name] = time.monotonic() - started[name]
+				else:
+					still_waiting.append(name)
+			waiting = still_waiting
+			remaining = deadline - time.monotonic()
+			if not waiting:
+				break
+			if remaining <= 0:
+				for name in waiting:
+					unconfirmed[name] = errno.ETIMEDOUT
+				break
+			time.sleep(min(interval, remaining))
+			interval = min(interval * 2, POLL_MAX_INTERVAL)
+		return list(started), confirmed
+	def run(self, names: Iterable[str]) -> list:
+		names = list(names)
+		failed = {}
+		downUnconfirmed = {}
+		upUnconfirmed = {}
+		cleared, down = self.transition(names, False, failed, downUnconfirmed)
+		# every interface IFF_UP was cleared on is brought up, an unconfirmed down may well have happened,
+		# only the ones the down ioctl failed on never left
+		_, up = self.transition(cleared, True, failed, upUnconfirmed)
+		return [ifaceResetResult(name, name in up, down.get(name), up.get(name),
+								failed.get(name, upUnconfirmed.get(name, 0)), downUnconfirmed.get(name, 0)) for name in names]
+
+def main(argv):
+	if len(argv) < 2:
+		sys.exit('usage: {0} interface [interface ...]'.format(argv[0]))
+	backend = socketIoctlBackend()
+	try:
+		results = ifaceReset(backend).run(argv[1:])
+	finally:
+		backend.close()
+	for result in results:
+		if result.ok and result.downErrno:
+			print(f'{result.name}: down not confirmed, {errno.errorcode.get(result.downErrno, result.downErrno)}, up in {result.up * 1000:.1f} ms')
+		elif result.ok:
+			print(f'{result.name}: down in {result.down * 1000:.1f} ms, up in {result.up * 1000:.1f} ms')
+		else:
+			print(f'{result.name}: failed, {errno.errorcode.get(result.errno, result.errno)}')
+
+if __name__ == '__main__':
+    main(sys.argv)
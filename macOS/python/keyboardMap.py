@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Character to key code map for the active keyboard layout, with a persistent cache keyed by the keyboard input source ID.
+
+Building the map takes 128 keyboard CGEvents, each wrapped in a NSEvent and looked at with no modifier, with shift and with alt.
+The result only depends on the layout, so it is saved to a cache file under the input source ID
+(com.apple.keylayout.US, com.apple.keylayout.French ...), later runs with the same layout only load a small JSON file.
+Switching layouts picks another entry, a layout never seen before is built and added to the cache.
+
+Key events sit behind a small backend interface
+- quartzEventBackend, the live CGEvent / NSEvent calls and the Text Input Source ID from HIToolbox,
+  it requires the pyobjc-framework-Quartz and pyobjc-framework-Cocoa modules
+- fakeEventBackend, a layout given as a dictionary, for unit tests on any platform
+
+    python3 keyboardMap.py [cacheFile]
+"""
+import abc, json, os, sys, tempfile, time
+
+SHIFT_KEY = 'SHIFT'
+ALT_KEY = 'ALT'
+KEY_CODES = 128
+
+CACHE_VERSION = 1
+CACHE_PATH = os.path.expanduser('~/Library/Caches/keyboardTypeString/keyboardMaps.json')
+
+class keyboardEventBackend(abc.ABC):
+    @abc.abstractmethod
+    def layoutID(self) -> str:
+        raise NotImplementedError
+    @abc.abstractmethod
+    def modifiers(self, keyCode: int) -> tuple:
+        # ( shift, alt ), whether pressing keyCode alone sets the shift / alt modifier flag
+        raise NotImplementedError
+    @abc.abstractmethod
+    def hasUnicode(self, keyCode: int) -> bool:
+        raise NotImplementedError
+    @abc.abstractmethod
+    def characters(self, keyCode: int, shift: bool = False, alt: bool = False) -> str:
+        raise NotImplementedError
+
+class quartzEventBackend(keyboardEventBackend):
+    def __init__(self):
+        # imported here so the map and cache logic works without PyObjC
+        import objc
+        from Foundation import NSBundle
+        from Quartz import CGEventSourceCreate, CGEventSourceStateID, kCGEventSourceStateHIDSystemState
+        self.eventSource = CGEventSourceCreate(CGEventSourceStateID(kCGEventSourceStateHIDSystemState))
+        # Text Input Sources are part of Carbon's HIToolbox, which PyObjC does not wrap
+        self.tis = {}
+        HIToolbox = NSBundle.bundleWithIdentifier_('com.apple.HIToolbox')
+        objc.loadBundleFunctions(HIToolbox, self.tis, [('TISCopyCurrentKeyboardLayoutInputSource', b'@'), ('TISGetInputSourceProperty', b'@@@')])
+        objc.loadBundleVariables(HIToolbox, self.tis, [('kTISPropertyInputSourceID', b'@')])
+    def layoutID(self) -> str:
+        source = self.tis['TISCopyCurrentKeyboardLayoutInputSource']()
+        return str(self.tis['TISGetInputSourceProperty'](source, self.tis['kTISPropertyInputSourceID']))
+    def event(self, keyCode: int, shift: bool = False, alt: bool = False):
+        from Quartz import CGEventCreateKeyboardEvent, CGEventFlags, CGEventGetFlags, CGEventSetFlags, \
+                        kCGEventFlagMaskShift, kCGEventFlagMaskAlternate
+        e = CGEventCreateKeyboardEvent(self.eventSource, keyCode, True)
+        if shift: CGEventSetFlags(e, CGEventGetFlags(e) | CGEventFlags(kCGEventFlagMaskShift))
+        if alt: CGEventSetFlags(e, CGEventGetFlags(e) | CGEventFlags(kCGEventFlagMaskAlternate))
+        return e
+    def modifiers(self, keyCode: int) -> tuple:
+        from Quartz import CGEventFlags, kCGEventFlagMaskShift, kCGEventFlagMaskAlternate
+        from AppKit import NSEvent
+        flags = NSEvent.eventWithCGEvent_(self.event(keyCode)).modifierFlags()
+        return ( CGEventFlags(kCGEventFlagMaskShift) & flags == CGEventFlags(kCGEventFlagMaskShift),
+                CGEventFlags(kCGEventFlagMaskAlternate) & flags == CGEventFlags(kCGEventFlagMaskAlternate) )
+    def hasUnicode(self, keyCode: int) -> bool:
+        from Quartz import CGEventKeyboardGetUnicodeString
+        return bool(CGEventKeyboardGetUnicodeString(self.event(keyCode), 1, None, None)[1])
+    def characters(self, keyCode: int, shift: bool = False, alt: bool = False) -> str:
+        from AppKit import NSEvent
+        return NSEvent.eventWithCGEvent_(self.event(keyCode, shift, alt)).characters()
+
+class fakeEventBackend(keyboardEventBackend):
+    def __init__(self, layout: dict, shiftKeyCode: int = 56, altKeyCode: int = 58, layoutID: str = 'fake'):
+        # layout : key code -> ( plain, shifted, alted ) characters
+        self.layout = layout
+        self.shiftKeyCode = shiftKeyCode
+        self.altKeyCode = altKeyCode
+        self.id = layoutID
+        self.calls = 0
+    def layoutID(self) -> str:
+        return self.id
+    def modifiers(self, keyCode: int) -> tuple:
+        self.calls += 1
+        return ( keyCode == self.shiftKeyCode, keyCode == self.altKeyCode )
+    def hasUnicode(self, keyCode: int) -> bool:
+        self.calls += 1
+        return keyCode in self.layout
+    def characters(self, keyCode: int, shift: bool = False, alt: bool = False) -> str:
+        self.calls += 1
+        return self.layout[keyCode][2 if alt else 1 if shift else 0]
+
+def buildKeyboardMap(backend: keyboardEventBackend) -> dict:
+    # Keyboards are very diverse, we need to create a map between characters and the currently used keyboard layout.
+    keyboardMap = {}
+    for i in range(KEY_CODES):
+        shift, alt = backend.modifiers(i)
+        if shift: keyboardMap[SHIFT_KEY] = { 'code':i, 'shift':False, 'alt':False}
+        if alt: keyboardMap[ALT_KEY] = { 'code':i, 'shift':False, 'alt':False}
+        if not backend.hasUnicode(i):
+            continue
+        # keys with no modifiers, then with shift pressed, then with alt pressed, the first key producing a character wins
+        for modifiers in ( { 'shift':False, 'alt':False}, { 'shift':True, 'alt':False}, { 'shift':False, 'alt':True} ):
+            char = backend.characters(i, **modifiers)
+            if char not in keyboardMap: keyboardMap[char] = { 'code':i, **modifiers }
+    return keyboardMap
+
+class keyboardMapCache:
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+    def load(self) -> dict:
+        # layout ID -> keyboard map, empty when the file is missing, unreadable or from another version
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+            return {}
+        return cache.get('layouts', {})
+    def save(self, layouts: dict) -> None:
+        # written next to the target then renamed over it, a concurrent run never reads half a file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.keyboardMaps.')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+                json.dump({ 'version': CACHE_VERSION, 'layouts': layouts }, tmp, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    def keyboardMap(self, backend: keyboardEventBackend) -> dict:
+        layouts = self.load()
+        layoutID = backend.layoutID()
+        if layoutID not in layouts:
+            layouts[layoutID] = buildKeyboardMap(backend)
+            try:
+                self.save(layouts)
+            except OSError:
+                # a read-only home is not a reason not to type
+                pass
+        return layouts[layoutID]
+
+def main(argv):
+    if len(argv) > 2:
+        sys.exit('usage: {0} [cacheFile]'.format(argv[0]))
+    cache = keyboardMapCache(*argv[1:])
+    backend = quartzEventBackend()
+    start = time.perf_counter()
+    keyboardMap = cache.keyboardMap(backend)
+    print(f'{backend.layoutID()}: {len(keyboardMap)} characters in {(time.perf_counter() - start) * 1000:.2f} ms')
+
+if __name__ == '__main__':
+    main(sys.argv)
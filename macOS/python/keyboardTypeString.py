@@ -6,33 +6,30 @@ This example app allows you to paste a string into any other app by first pressi
 
 It can easily be modified to support you pasting the string from the clipboard using the module getpass for example.
 
+The string can also be streamed in, from stdin with - or from a file or a FIFO with --file PATH, it then never shows up in the process arguments,
+is not limited by ARG_MAX, and is typed as it is read, a few kilobytes at a time, whatever its size.
+
+    python3 keyboardTypeString.py [--keycodes|--unicode] messageToType|-|--file PATH
+
 This code needs accessibility permissions set for the terminal application in use, but it checks for such permissions and waits on you to actually make the necessary changes.
 
 This code requires a Terminal application running in Sandbox and Signed (Terminal.app is in that case) otherwise the events do not get received.
 
 It also requires the following modules : pyobjc-framework-ApplicationServices, pyobjc-framework-Cocoa, pyobjc-framework-Quartz
 """
-import sys
+import os, sys
 from Quartz import CGEventSourceCreate, \
-                CGEventCreateKeyboardEvent, \
-                CGEventKeyboardGetUnicodeString, \
-                CGEventFlags, \
-                CGEventGetFlags, \
-                CGEventSetFlags, \
-                CGEventPost, \
                 CGEventSourceStateID, \
                 CGEventTapLocation, \
                 kCGHIDEventTap, \
-                kCGEventSourceStateHIDSystemState, \
-                kCGEventFlagMaskShift, \
-                kCGEventFlagMaskAlternate
+                kCGEventSourceStateHIDSystemState
+from keyboardMap import SHIFT_KEY, ALT_KEY, quartzEventBackend, keyboardMapCache
+from keystrokeEngine import keystrokeEngine, quartzEventPoster, typingMode
 from ApplicationServices import kAXTrustedCheckOptionPrompt
 from HIServices import AXIsProcessTrustedWithOptions, AXIsProcessTrusted
 from AppKit import NSApplication, NSObject, NSBundle, NSDistributedNotificationCenter,\
-                NSControlKeyMask, NSEvent, NSTimer, NSKeyDownMask
+                NSControlKeyMask, NSEvent, NSTimer, NSKeyDownMask, NSWorkspace
 
-SHIFT_KEY = 'SHIFT'
-ALT_KEY = 'ALT'
 RETURN_KEY = '\r'
 BACKSPACE_KEY = '\u007f'
 
@@ -41,71 +38,33 @@ def log( message, verbose=False ):
         print( message, file=sys.stderr )
 
 class keyboardController:
-    def __init__(self):
-        # Keyboards are very diverse, we need to create a map between characters and the currently used keyboard layout.
-        self.keyboardMap = {}
+    def __init__(self, backend=None, cache=None):
+        # Keyboards are very diverse, we need a map between characters and the currently used keyboard layout, it is built once per layout and then loaded from the cache.
         self.eventSource = CGEventSourceCreate(CGEventSourceStateID(kCGEventSourceStateHIDSystemState))
         self.eventTapLocation = CGEventTapLocation(kCGHIDEventTap)
-        i = 0
-        while i < 128:
-            e = CGEventCreateKeyboardEvent(self.eventSource, i, True)
-            nse = NSEvent.eventWithCGEvent_(e)
-            if CGEventFlags(kCGEventFlagMaskShift) & nse.modifierFlags() == CGEventFlags(kCGEventFlagMaskShift):
-                self.keyboardMap['SHIFT'] = { 'code':i, 'shift':False, 'alt':False}
-                self.shiftKeyCode = i
-            if CGEventFlags(kCGEventFlagMaskAlternate) & nse.modifierFlags() == CGEventFlags(kCGEventFlagMaskAlternate):
-                self.keyboardMap['ALT'] = { 'code':i, 'shift':False, 'alt':False}
-                self.altKeyCode = i
-            u = CGEventKeyboardGetUnicodeString(e, 1, None, None)
-            if not u[1]:
-                i+=1
-                continue
-            # keys with no modifiers
-            char = nse.characters()
-            if char not in self.keyboardMap.keys(): self.keyboardMap[char] = { 'code':i, 'shift':False, 'alt':False}
-            # keys with shift pressed
-            CGEventSetFlags(e, CGEventGetFlags(e) | CGEventFlags(kCGEventFlagMaskShift))
-            nse = NSEvent.eventWithCGEvent_(e)
-            char = nse.characters()
-            if char not in self.keyboardMap.keys(): self.keyboardMap[char] = { 'code':i, 'shift':True, 'alt':False}
-            CGEventSetFlags(e, CGEventGetFlags(e) & ~CGEventFlags(kCGEventFlagMaskShift))
-            # keys with alt pressed
-            CGEventSetFlags(e, CGEventGetFlags(e) | CGEventFlags(kCGEventFlagMaskAlternate))
-            nse = NSEvent.eventWithCGEvent_(e)
-            char = nse.characters()
-            if char not in self.keyboardMap.keys(): self.keyboardMap[char] = { 'code':i, 'shift':False, 'alt':True}
-            i+=1
+        if backend is None: backend = quartzEventBackend()
+        if cache is None: cache = keyboardMapCache()
+        self.keyboardMap = cache.keyboardMap(backend)
+        self.shiftKeyCode = self.keyboardMap.get(SHIFT_KEY, {}).get('code')
+        self.altKeyCode = self.keyboardMap.get(ALT_KEY, {}).get('code')
         self.returnKeyCode = self.keyboardMap[RETURN_KEY]['code']
         self.backSpaceKeyCode = self.keyboardMap[BACKSPACE_KEY]['code']
-    def typeString(self, passPhrase, backspace=False):
-        # a key press is at least 2 events, key down and key up, but if it's a capital letter or a special character we need to press down SHIFT or ALT down before and later up ...
-        def pressKeyWithModifier(keyCode, modifierKeyCode, modifierFlag):
-            modifierEvent = CGEventCreateKeyboardEvent(self.eventSource, modifierKeyCode, True)
-            CGEventPost(self.eventTapLocation, modifierEvent)
-            keyEvent = CGEventCreateKeyboardEvent(self.eventSource, keyCode, True)
-            CGEventSetFlags(keyEvent, CGEventGetFlags(keyEvent) | CGEventFlags(modifierFlag))
-            CGEventPost(self.eventTapLocation, keyEvent)
-            modifierEvent = CGEventCreateKeyboardEvent(self.eventSource, modifierKeyCode, False)
-            CGEventPost(self.eventTapLocation, modifierEvent)
-            keyEvent = CGEventCreateKeyboardEvent(self.eventSource, keyCode, False)
-            CGEventSetFlags(keyEvent, CGEventGetFlags(keyEvent) & ~CGEventFlags(modifierFlag))
-            CGEventPost(self.eventTapLocation, keyEvent)
-        def pressKey(keyCode):
-            keyEvent = CGEventCreateKeyboardEvent(self.eventSource, keyCode, True)
-            CGEventPost(self.eventTapLocation, keyEvent)
-            keyEvent = CGEventCreateKeyboardEvent(self.eventSource, keyCode, False)
-            CGEventPost(self.eventTapLocation, keyEvent)
-        i = 0
-        if backspace: pressKey(self.backSpaceKeyCode)
-        while i < len(passPhrase):
-            settings = self.keyboardMap[passPhrase[i]]
-            keyCode = settings['code']
-            if settings['shift']: keyEvent = pressKeyWithModifier( keyCode, self.shiftKeyCode, kCGEventFlagMaskShift )
-            elif settings['alt']: keyEvent = pressKeyWithModifier( keyCode, self.altKeyCode, kCGEventFlagMaskAlternate )
-            else: pressKey(keyCode)
-            i+=1
-        # pressing the return key after we're done processing the string.
-        pressKey(self.returnKeyCode)
+    def typeString(self, passPhrase, backspace=False, rate=None, mode='auto'):
+        # passPhrase is a string, or a binary stream typed as it is read
+        # the keystroke engine reuses one event per key and modifier state, holds SHIFT or ALT down across consecutive characters needing it,
+        # and paces the posts, as fast as the system keeps up with by default
+        engine = keystrokeEngine(quartzEventPoster(self.eventSource, self.eventTapLocation), self.keyboardMap, self.shiftKeyCode, self.altKeyCode, rate)
+        # up to 20 characters per event as unicode strings, characters missing from the layout included,
+        # unless the frontmost app only passes key codes on (screen sharing, virtual machines ...) or mode says otherwise
+        frontmost = NSWorkspace.sharedWorkspace().frontmostApplication()
+        unicode = typingMode(frontmost.bundleIdentifier() if frontmost is not None else None, mode)
+        if isinstance(passPhrase, str):
+            # pressing the return key after we're done processing the string.
+            engine.type(f'{BACKSPACE_KEY if backspace else ""}{passPhrase}{RETURN_KEY}', unicode)
+            return
+        if backspace: engine.type(BACKSPACE_KEY)
+        engine.typeStream(passPhrase, unicode)
+        engine.type(RETURN_KEY)
 
 # seperate class to define the necessary event handlers used to react to permission changes as well as key presses
 class eventManager:
@@ -121,7 +80,12 @@ class eventManager:
             # stopping the keyEvent monitor
             NSEvent.removeMonitor_(self.keyMonitor)
             # initialize a keyboard controller object, and run the function to type the strings as a suite of virtual keyboard key presses.
-            keyboardController().typeString(self.string, backspace=True)
+            if self.path is None:
+                keyboardController().typeString(self.string, backspace=True, mode=self.mode)
+            else:
+                # opened only now, a FIFO writer is not waited on before p gets pressed, unbuffered so whatever arrives gets typed
+                with open(self.path, 'rb', buffering=0, closefd=self.path != sys.stdin.fileno()) as stream:
+                    keyboardController().typeString(stream, backspace=True, mode=self.mode)
             # wait 500ms for the all the keys we pressed to be processed by the system, then we exit the runloop
             NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(0.5, self, "exitRunLoop:", None, False)
 
@@ -157,8 +121,19 @@ class AppDelegate(NSObject, eventManager):
 
 
 def main(argv):
+    # --keycodes / --unicode force a typing mode, by default it depends on the app the string is typed into
+    modes = { '--keycodes': 'keycodes', '--unicode': 'unicode' }
+    mode = modes[argv[1]] if len(argv) >= 3 and argv[1] in modes else 'auto'
+    if mode != 'auto': argv = argv[:1] + argv[2:]
+    # - reads the string from stdin, --file PATH from a file or a FIFO
+    path = None
+    if len(argv) == 2 and argv[1] == '-':
+        path = sys.stdin.fileno()
+    elif len(argv) == 3 and argv[1] == '--file':
+        path = os.path.abspath(argv[2])
+        argv = argv[:2]
     if len(argv) != 2:
-        sys.exit('usage: {0} messageToType'.format(argv[0]))
+        sys.exit('usage: {0} [--keycodes|--unicode] messageToType|-|--file PATH'.format(argv[0]))
 
     # this is to prevent the interpreter icon to show up in dock ...
     info = NSBundle.mainBundle().infoDictionary()
@@ -166,7 +141,9 @@ def main(argv):
 
     # initializating the app delegate object, storing the string value in the object so the delegate subfunctions can access it.
     app = AppDelegate.new()
-    app.string = argv[1]
+    app.string = argv[1] if path is None else None
+    app.path = path
+    app.mode = mode
 
     # run the application runloop
     NSApplication.sharedApplication().run()
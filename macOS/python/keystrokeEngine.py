@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Keystroke injection engine for keyboardTypeString, built for long strings typed fast without dropped characters.
+
+- the string is first turned into a plan, a flat list of ( key code, key down, flags, text ) events
+- with key codes, modifiers are coalesced, a run of shifted characters is typed inside a single shift down / shift up pair,
+  every distinct ( key code, key down, flags ) event is created once by the poster and reused for every post
+- with unicode, the text is attached to the key events with CGEventKeyboardSetUnicodeString, UNICODE_CHUNK UTF-16 units
+  per event (surrogate pairs are never split), any character can be typed, dead-key accents, emoji and CJK included,
+  control characters (return, backspace, tab ...) are still typed with their key code when the layout has one
+- characters the layout has no key for always go in unicode chunks, with key codes too
+- newlines are typed with the return key, a \n or \r\n is a \r when the layout has no key for \n
+- typingMode picks key codes or unicode for a run, apps forwarding key codes to another machine (remote desktops,
+  virtual machines) ignore the unicode strings and get key codes, everything else gets unicode chunks
+- typeStream types from a binary stream (stdin, a file, a FIFO) as the data arrives, STREAM_CHUNK bytes at a time into
+  one reused buffer, decoded incrementally and zeroed once typed, memory stays constant whatever the text size
+- posts are paced by a rate controller
+  - fixedRate, a set number of keys per second, scheduled against a monotonic clock so it does not drift
+  - adaptiveRate, as fast as the consumer keeps up with, up to a ceiling, a post which blocks longer than usual is taken
+    as backpressure and halves the rate, every key posted in time raises it again (AIMD)
+
+Posting sits behind a small interface
+- quartzEventPoster, CGEventCreateKeyboardEvent / CGEventPost, it requires the pyobjc-framework-Quartz module
+- fakeEventPoster, a simulated consumer draining a bounded queue at a set rate, for benchmarks and tests on any platform
+
+    python3 keystrokeEngine.py [characters]
+"""
+import abc, codecs, sys, time
+from itertools import groupby
+from typing import NamedTuple
+
+# CGEventFlags values, kCGEventFlagMaskShift and kCGEventFlagMaskAlternate
+FLAG_SHIFT = 0x00020000
+FLAG_ALT = 0x00080000
+MODIFIERS = { 'shift': FLAG_SHIFT, 'alt': FLAG_ALT }
+
+# UTF-16 units a single keyboard event carries, the system ignores anything past 20
+UNICODE_CHUNK = 20
+# the key code unicode events are sent with, the attached string is what gets typed
+UNICODE_KEY_CODE = 0
+
+TYPING_MODES = ( 'auto', 'keycodes', 'unicode' )
+# bytes read from a stream at a time
+STREAM_CHUNK = 4096
+# bundle IDs of apps which send key codes on to another machine, unicode strings do not make it through them
+KEYCODE_APPS = frozenset(( 'com.apple.ScreenSharing', 'com.microsoft.rdc.macos', 'com.vmware.fusion',
+                        'com.parallels.desktop.console', 'org.virtualbox.app.VirtualBoxVM', 'com.realvnc.vncviewer',
+                        'com.citrix.receiver.icaviewer.mac', 'com.utmapp.UTM' ))
+
+class keyEvent(NamedTuple):
+    code: int
+    down: bool
+    flags: int = 0
+    # UTF-16 text attached with CGEventKeyboardSetUnicodeString, empty for plain key code events
+    text: str = ''
+
+def typingMode(bundleID: str, mode: str = 'auto') -> bool:
+    # True when typing into bundleID goes with unicode chunks
+    if mode == 'auto':
+        return bundleID not in KEYCODE_APPS
+    return mode == 'unicode'
+
+def utf16Length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+def unicodeChunks(text: str, size: int = UNICODE_CHUNK) -> list:
+    # runs of at most size UTF-16 units, characters outside the BMP take two and stay in one chunk
+    chunks = []
+    start = 0
+    units = 0
+    for idx, char in enumerate(text):
+        width = 2 if ord(char) > 0xffff else 1
+        if units + width > size:
+            chunks.append(text[start:idx])
+            start = idx
+            units = 0
+        units += width
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+def returnKeys(text: str, keyboardMap: dict) -> str:
+    # no layout has a key typing \n, return types \r
+    if '\n' in keyboardMap:
+        return text
+    return text.replace('\r\n', '\r').replace('\n', '\r')
+
+def isControl(char: str) -> bool:
+    return ord(char) < 0x20 or ord(char) == 0x7f
+
+def planKeystrokes(text: str, keyboardMap: dict, shiftKeyCode: int, altKeyCode: int, unicode: bool = False) -> list:
+    # the events typing text, characters missing from keyboardMap always go in unicode chunks,
+    # with unicode everything but the control characters does too
+    plan = []
+    for keyCodes, run in groupby(text, lambda char: char in keyboardMap and (not unicode or isControl(char))):
+        run = ''.join(run)
+        if keyCodes:
+            plan += planKeyCodes(run, keyboardMap, shiftKeyCode, altKeyCode)
+            continue
+        for chunk in unicodeChunks(run):
+            plan.append(keyEvent(UNICODE_KEY_CODE, True, 0, chunk))
+            plan.append(keyEvent(UNICODE_KEY_CODE, False, 0, chunk))
+    return plan
+
+def planKeyCodes(text: str, keyboardMap: dict, shiftKeyCode: int, altKeyCode: int) -> list:
+    # key code events for characters of keyboardMap, a modifier stays down across consecutive characters needing it
+    modifierKeys = { 'shift': shiftKeyCode, 'alt': altKeyCode }
+    plan = []
+    held = None
+    for char in text:
+        settings = keyboardMap[char]
+        needed = 'shift' if settings['shift'] else 'alt' if settings['alt'] else None
+        if needed != held:
+            if held is not None:
+                plan.append(keyEvent(modifierKeys[held], False))
+            if needed is not None:
+                plan.append(keyEvent(modifierKeys[needed], True))
+            held = needed
+        flags = MODIFIERS[held] if held is not None else 0
+        plan.append(keyEvent(settings['code'], True, flags))
+        plan.append(keyEvent(settings['code'], False, flags))
+    if held is not None:
+        plan.append(keyEvent(modifierKeys[held], False))
+    return plan
+
+class keyEventPoster(abc.ABC):
+    @abc.abstractmethod
+    def event(self, key: keyEvent):
+        # the platform event for key, key code events are created on first use and reused from then on,
+        # unicode events are created every time, the typed text is never kept around
+        raise NotImplementedError
+    @abc.abstractmethod
+    def post(self, event) -> None:
+        raise NotImplementedError
+
+class quartzEventPoster(keyEventPoster):
+    def __init__(self, eventSource, eventTapLocation):
+        # imported here so the planning and pacing logic works without PyObjC
+        from Quartz import CGEventCreateKeyboardEvent, CGEventKeyboardSetUnicodeString, CGEventGetFlags, CGEventSetFlags, CGEventPost
+        self.createEvent = CGEventCreateKeyboardEvent
+        self.setUnicodeString = CGEventKeyboardSetUnicodeString
+        self.getFlags = CGEventGetFlags
+        self.setFlags = CGEventSetFlags
+        self.postEvent = CGEventPost
+        self.eventSource = eventSource
+        self.eventTapLocation = eventTapLocation
+        self.events = {}
+    def event(self, key: keyEvent):
+        if key.text:
+            event = self.createEvent(self.eventSource, key.code, key.down)
+            self.setUnicodeString(event, utf16Length(key.text), key.text)
+            return event
+        event = self.events.get(key)
+        if event is None:
+            event = self.createEvent(self.eventSource, key.code, key.down)
+            # added to the flags the event source gives them, modifier key events keep those as they are
+            if key.flags: self.setFlags(event, self.getFlags(event) | key.flags)
+            self.events[key] = event
+        return event
+    def post(self, event) -> None:
+        self.postEvent(self.eventTapLocation, event)
+
+class fakeEventPoster(keyEventPoster):
+    def __init__(self, drainRate: float = 0., capacity: int = 0):
+        # drainRate events per second taken off a queue of capacity events, a post blocks while the queue is full,
+        # drainRate 0 for a consumer which never falls behind
+        self.drainRate = drainRate
+        self.capacity = capacity
+        self.queued = 0.
+        self.last = time.perf_counter()
+        self.events = {}
+        self.created = 0
+        self.posted = []
+    def event(self, key: keyEvent):
+        if key.text:
+            self.created += 1
+            return key
+        event = self.events.get(key)
+        if event is None:
+            self.created += 1
+            event = self.events[key] = key
+        return event
+    def post(self, event) -> None:
+        if self.drainRate:
+            now = time.perf_counter()
+            self.queued = max(0., self.queued - (now - self.last) * self.drainRate)
+            self.last = now
+            if self.queued + 1 > self.capacity:
+                # blocking until the consumer made room
+                time.sleep((self.queued + 1 - self.capacity) / self.drainRate)
+                self.queued = self.capacity - 1.
+                self.last = time.perf_counter()
+            self.queued += 1
+        self.posted.append(event)
+
+class fixedRate:
+    def __init__(self, keysPerSecond: float):
+        self.interval = 1. / keysPerSecond
+        self.next = None
+    def wait(self, postSeconds: float) -> None:
+        # called once per key down, sleeps until that key's slot
+        now = time.perf_counter()
+        if self.next is None or self.next < now - self.interval:
+            # first key, or we fell far behind, not trying to catch up with a burst
+            self.next = now
+        if self.next > now:
+            time.sleep(self.next - now)
+        self.next += self.interval
+
+class adaptiveRate:
+    def __init__(self, maxKeysPerSecond: float = 2000., minKeysPerSecond: float = 20., slowPost: float = .002, step: float = 50.):
+        # a post taking more than slowPost seconds is backpressure, step keys per second are added back for every key posted in time
+        self.maxRate = maxKeysPerSecond
+        self.minRate = minKeysPerSecond
+        self.slowPost = slowPost
+        self.step = step
+        self.rate = maxKeysPerSecond
+        self.next = None
+    def wait(self, postSeconds: float) -> None:
+        if postSeconds > self.slowPost:
+            self.rate = max(self.minRate, self.rate / 2)
+        else:
+            self.rate = min(self.maxRate, self.rate + self.step)
+        now = time.perf_counter()
+        if self.next is None or self.next < now:
+            self.next = now
+        if self.next > now:
+            time.sleep(self.next - now)
+        self.next += 1. / self.rate
+
+class typingResult(NamedTuple):
+    keys: int
+    events: int
+    seconds: float
+
+class keystrokeEngine:
+    def __init__(self, poster: keyEventPoster, keyboardMap: dict, shiftKeyCode: int, altKeyCode: int, rate = None):
+        self.poster = poster
+        self.keyboardMap = keyboardMap
+        self.shiftKeyCode = shiftKeyCode
+        self.altKeyCode = altKeyCode
+        self.rate = adaptiveRate() if rate is None else rate
+    def type(self, text: str, unicode: bool = False) -> typingResult:
+        text = returnKeys(text, self.keyboardMap)
+        plan = planKeystrokes(text, self.keyboardMap, self.shiftKeyCode, self.altKeyCode, unicode)
+        events = [self.poster.event(key) for key in plan]
+        post = self.poster.post
+        wait = self.rate.wait
+        postSeconds = 0.
+        start = time.perf_counter()
+        for key, event in zip(plan, events):
+            # pacing is per key press or unicode chunk, modifier and key up events follow right away
+            if key.down and (key.text or key.code != self.shiftKeyCode and key.code != self.altKeyCode):
+                wait(postSeconds)
+            before = time.perf_counter()
+            post(event)
+            postSeconds = time.perf_counter() - before
+        return typingResult(len(text), len(plan), time.perf_counter() - start)
+    def typeStream(self, stream, unicode: bool = False, chunkSize: int = STREAM_CHUNK, encoding: str = 'utf-8') -> typingResult:
+        # stream is a binary file object, read with readinto, an unbuffered one (buffering=0) returns what a pipe or FIFO
+        # has so far and typing starts right away, a multi-byte character split between reads waits in the decoder
+        decoder = codecs.getincrementaldecoder(encoding)()
+        buffer = bytearray(chunkSize)
+        view = memoryview(buffer)
+        zeros = memoryview(bytes(chunkSize))
+        keys = events = 0
+        seconds = 0.
+        # a \r\n split between two reads is still one return
+        afterCR = False
+        try:
+            while True:
+                size = stream.readinto(buffer)
+                if size is None:
+                    # a non-blocking stream with nothing to read yet
+                    time.sleep(.01)
+                    continue
+                text = decoder.decode(view[:size], final=not size)
+                # the bytes are not kept past their decoding
+                view[:size] = zeros[:size]
+                if afterCR and text.startswith('\n') and '\n' not in self.keyboardMap:
+                    # that \n was the end of the \r\n, a \n after it is a line of its own
+                    text = text[1:]
+                    afterCR = False
+                if text:
+                    afterCR = text.endswith('\r')
+                    result = self.type(text, unicode)
+                    keys += result.keys
+                    events += result.events
+                    seconds += result.seconds
+                if not size:
+                    return typingResult(keys, events, seconds)
+        finally:
+            view.release()
+
+def benchmarkLayout() -> tuple:
+    # a US like layout, enough characters for a random secret
+    lower = 'abcdefghijklmnopqrstuvwxyz0123456789-=[];,./'
+    upper = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ)!@#$%^&*(_+{}:<>?'
+    keyboardMap = { 'SHIFT': { 'code': 56, 'shift': False, 'alt': False }, 'ALT': { 'code': 58, 'shift': False, 'alt': False } }
+    for code, ( plain, shifted ) in enumerate(zip(lower, upper)):
+        keyboardMap[plain] = { 'code': code, 'shift': False, 'alt': False }
+        keyboardMap[shifted] = { 'code': code, 'shift': True, 'alt': False }
+    return keyboardMap, lower + upper
+
+def typedText(posted: list, keyboardMap: dict, shiftKeyCode: int, altKeyCode: int) -> str:
+    # what the fakeEventPoster events type, read back through keyboardMap
+    characters = { ( settings['code'], settings['shift'], settings['alt'] ): char for char, settings in keyboardMap.items() if len(char) == 1 }
+    text = []
+    for key in posted:
+        if not key.down:
+            continue
+        if key.text:
+            text.append(key.text)
+        elif key.code not in ( shiftKeyCode, altKeyCode ):
+            text.append(characters[( key.code, bool(key.flags & FLAG_SHIFT), bool(key.flags & FLAG_ALT) )])
+    return ''.join(text)
+
+def checkStreams() -> None:
+    # \n and \r\n, split between reads or not, are typed with the return key, in both modes
+    import io
+    keyboardMap, _ = benchmarkLayout()
+    keyboardMap['\r'] = { 'code': 36, 'shift': False, 'alt': False }
+    for data, expected in ( ( b'pw\n', 'pw\r' ), ( b'a\r\nb\nC\r\r\n', 'a\rb\rC\r\r' ), ( '\u00e9\U0001f600\tX\n'.encode(), '\u00e9\U0001f600\tX\r' ),
+                            ( b'\r\n\n', '\r\r' ), ( b'a\r\n\nb', 'a\r\rb' ) ):
+        for unicode in ( False, True ):
+            for chunkSize in ( 1, 2, 3, 4096 ):
+                poster = fakeEventPoster()
+                keystrokeEngine(poster, keyboardMap, 56, 58, fixedRate(1e9)).typeStream(io.BytesIO(data), unicode, chunkSize)
+                typed = typedText(poster.posted, keyboardMap, 56, 58)
+                assert typed == expected, f'{data!r} typed as {typed!r}, unicode={unicode}, chunkSize={chunkSize}'
+
+def main(argv):
+    if len(argv) > 2:
+        sys.exit('usage: {0} [characters]'.format(argv[0]))
+    import random
+    count = int(argv[1]) if len(argv) == 2 else 4096
+    keyboardMap, alphabet = benchmarkLayout()
+    text = ''.join(random.choice(alphabet) for _ in range(count))
+    for name, poster, rate, unicode in (
+            ( 'unpaced, instant consumer', fakeEventPoster(), fixedRate(1e9), False ),
+            ( 'adaptive, consumer at 5000 events/s', fakeEventPoster(5000., 256), adaptiveRate(maxKeysPerSecond=5000.), False ),
+            ( 'fixed 1000 keys/s', fakeEventPoster(), fixedRate(1000.), False ),
+            ( 'unicode chunks, adaptive, consumer at 5000 events/s', fakeEventPoster(5000., 256), adaptiveRate(maxKeysPerSecond=5000.), True ) ):
+        result = keystrokeEngine(poster, keyboardMap, 56, 58, rate).type(text, unicode)
+        print(f'{name}: {result.keys} keys, {result.events} events ({poster.created} created) in {result.seconds:.3f} s, '
+              f'{result.keys / result.seconds:.0f} keys/s')
+    import io
+    poster = fakeEventPoster()
+    result = keystrokeEngine(poster, keyboardMap, 56, 58, fixedRate(1e9)).typeStream(io.BytesIO(text.encode()), chunkSize=256)
+    print(f'streamed in 256 byte chunks: {result.keys} keys, {result.events} events ({poster.created} created) in {result.seconds:.3f} s')
+    checkStreams()
+    print('streams with newlines: ok')
+
+if __name__ == '__main__':
+    main(sys.argv)
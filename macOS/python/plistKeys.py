@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Reads a few top level keys out of a property list file, without decoding the rest of it.
+
+plistlib.loads decodes the whole object graph, icons, entitlements or localized tables included, even when a single
+string is needed. Here the file is memory mapped and only what the requested keys need gets looked at
+
+- bplist00 : the trailer, then the top dictionary key references, each object offset is read from the offset table
+  when that object is needed, only the values of the requested keys are decoded, the cost does not follow the file size
+- XML : the document goes through expat a chunk at a time and the parse stops as soon as every requested key was seen
+  and the rest of the file cannot hold any of them again, the byte range of each value is then handed to plistlib,
+  a key repeated in the dictionary resolves to its last value like in plistlib
+- anything else (UTF-16 XML, a top object which is not a dictionary ...) is left to plistlib.loads
+
+The values are the ones plistlib gives for a well formed file, the errors are plistlib.InvalidFileException or
+xml.parsers.expat.ExpatError like plistlib, a damaged object the requested keys do not lead to is not noticed.
+
+	python3 plistKeys.py plistFile key [key ...]
+"""
+import json, mmap, os, plistlib, struct, sys, time
+from datetime import datetime, timedelta
+from typing import Iterable
+from xml.parsers.expat import ParserCreate
+
+BINARY_HEADER = b'bplist00'
+BINARY_TRAILER = struct.Struct('>6xBBQQQ')
+# sizes of the integers _get_size reads after a 0xF length nibble
+SIZE_FORMATS = { 1: 'B', 2: 'H', 4: 'L', 8: 'Q' }
+XML_CHUNK = 16384
+
+class binaryPlistReader:
+	def __init__(self, buffer):
+		# buffer is the whole file, bytes or a mmap
+		self.buffer = buffer
+		try:
+			self.offsetSize, self.refSize, self.count, self.topRef, self.tableOffset = \
+				BINARY_TRAILER.unpack_from(buffer, len(buffer) - BINARY_TRAILER.size)
+		except struct.error:
+			raise plistlib.InvalidFileException()
+		if not self.offsetSize or not self.refSize:
+			raise plistlib.InvalidFileException()
+		# ref -> decoded object, only the ones looked at, a container is in there while its members are read
+		self.objects = {}
+	def read(self, pos: int, size: int) -> bytes:
+		if pos + size > len(self.buffer):
+			raise plistlib.InvalidFileException()
+		return self.buffer[pos:pos + size]
+	def int(self, pos: int, size: int) -> int:
+		return int.from_bytes(self.read(pos, size), 'big')
+	def offset(self, ref: int) -> int:
+		if ref >= self.count:
+			raise plistlib.InvalidFileException()
+		return self.int(self.tableOffset + ref * self.offsetSize, self.offsetSize)
+	def refs(self, pos: int, count: int) -> list:
+		return [self.int(pos + idx * self.refSize, self.refSize) for idx in range(count)]
+	def size(self, pos: int, tokenL: int) -> tuple:
+		# ( length, position of the content )
+		if tokenL != 0xF:
+			return tokenL, pos
+		width = 1 << (self.read(pos, 1)[0] & 0x3)
+		return struct.unpack('>' + SIZE_FORMATS[width], self.read(pos + 1, width))[0], pos + 1 + width
+	def container(self, ref: int) -> tuple:
+		# ( token, length, position of the references ) of an array or dictionary
+		pos = self.offset(ref)
+		token = self.read(pos, 1)[0]
+		return ( token, *self.size(pos + 1, token & 0x0F) )
+	def object(self, ref: int):
+		if ref in self.objects:
+			return self.objects[ref]
+		pos = self.offset(ref)
+		token = self.read(pos, 1)[0]
+		tokenH, tokenL = token & 0xF0, token & 0x0F
+		pos += 1
+		if token == 0x00:
+			result = None
+		elif token == 0x08:
+			result = False
+		elif token == 0x09:
+			result = True
+		elif token == 0x0f:
+			result = b''
+		elif tokenH == 0x10:
+			result = int.from_bytes(self.read(pos, 1 << tokenL), 'big', signed=tokenL >= 3)
+		elif token == 0x22:
+			result = struct.unpack('>f', self.read(pos, 4))[0]
+		elif token == 0x23:
+			result = struct.unpack('>d', self.read(pos, 8))[0]
+		elif token == 0x33:
+			# seconds since 1/1/2001
+			result = datetime(2001, 1, 1) + timedelta(seconds=struct.unpack('>d', self.read(pos, 8))[0])
+		elif tokenH == 0x40:
+			size, pos = self.size(pos, tokenL)
+			result = bytes(self.read(pos, size))
+		elif tokenH == 0x50:
+			size, pos = self.size(pos, tokenL)
+			result = self.read(pos, size).decode('ascii')
+		elif tokenH == 0x60:
+			size, pos = self.size(pos, tokenL)
+			result = self.read(pos, size * 2).decode('utf-16be')
+		elif tokenH == 0x80:
+			result = plistlib.UID(self.int(pos, 1 + tokenL))
+		elif tokenH == 0xA0:
+			size, pos = self.size(pos, tokenL)
+			result = self.objects[ref] = []
+			result.extend(self.object(member) for member in self.refs(pos, size))
+		elif tokenH == 0xD0:
+			size, pos = self.size(pos, tokenL)
+			result = self.objects[ref] = {}
+			try:
+				for key, value in zip(self.refs(pos, size), self.refs(pos + size * self.refSize, size)):
+					result[self.object(key)] = self.object(value)
+			except TypeError:
+				raise plistlib.InvalidFileException()
+		else:
+			raise plistlib.InvalidFileException()
+		self.objects[ref] = result
+		return result
+	def topKeys(self) -> dict:
+		# key -> value reference of the top dictionary, None when the top object is not a dictionary
+		token, size, pos = self.container(self.topRef)
+		if token & 0xF0 != 0xD0:
+			return None
+		# the last of a repeated key wins, like in plistlib
+		return dict(zip(map(self.object, self.refs(pos, size)), self.refs(pos + size * self.refSize, size)))
+	def get(self, keys: Iterable[str]) -> dict:
+		refs = self.topKeys()
+		if refs is None:
+			return None
+		return { key: self.object(refs[key]) for key in keys if key in refs }
+
+class xmlKeysFound(Exception):
+	pass
+
+# markup which can spell a key without its raw bytes, an entity or character reference, CDATA, a comment or a
+# processing instruction splitting it
+XML_KEY_ESCAPES = ( b'&', b'<![CDATA[', b'<!--', b'<?' )
+
+def xmlKeysMayRepeat(buffer, keys: Iterable[str], pos: int) -> bool:
+	# False when no <key> past pos can be one of keys, a few substring searches instead of parsing the rest
+	return any(buffer.find(marker, pos) >= 0 for marker in ( *( key.encode('utf-8') for key in keys ), *XML_KEY_ESCAPES ))
+
+def xmlPlistKeys(buffer, keys: Iterable[str], chunk: int = XML_CHUNK) -> dict:
+	# key -> value of the top dictionary, None when the top object is not a dictionary
+	wanted = set(keys)
+	ranges = {}
+	# scanAll once a requested key may come again, the parse then goes on to the end of the top dictionary
+	state = { 'depth': 0, 'prefix': None, 'key': None, 'text': None, 'start': None, 'end': None, 'dict': False, 'scanAll': False }
+	parser = ParserCreate()
+	def startElement(name, attributes):
+		state['depth'] += 1
+		depth = state['depth']
+		if depth == 1:
+			# everything up to the <plist> tag, the value ranges are parsed inside it
+			state['prefix'] = buffer.find(b'>', parser.CurrentByteIndex) + 1
+		elif depth == 2:
+			state['dict'] = name == 'dict'
+		elif depth == 3 and state['dict']:
+			if name == 'key':
+				state['text'] = []
+			elif state['key'] in wanted:
+				state['start'] = parser.CurrentByteIndex
+				# the end event of an empty element (<true/>) comes after its tag, the others at their end tag
+				tagEnd = buffer.find(b'>', state['start']) + 1
+				state['end'] = tagEnd if buffer[tagEnd - 2:tagEnd] == b'/>' else None
+	def endElement(name):
+		depth = state['depth']
+		state['depth'] -= 1
+		if depth == 2 and state['dict']:
+			# the end of the top dictionary, nothing more to find
+			raise xmlKeysFound()
+		if depth != 3 or not state['dict']:
+			return
+		if name == 'key':
+			state['key'] = ''.join(state['text'])
+			state['text'] = None
+			return
+		if state['start'] is not None:
+			# a repeated key overwrites the range, the last value wins
+			ranges[state['key']] = ( state['start'], state['end'] or buffer.find(b'>', parser.CurrentByteIndex) + 1 )
+			if len(ranges) == len(wanted) and not state['scanAll']:
+				if not xmlKeysMayRepeat(buffer, wanted, ranges[state['key']][1]):
+					raise xmlKeysFound()
+				state['scanAll'] = True
+		state['start'] = None
+		state['key'] = None
+	def characterData(data):
+		if state['text'] is not None:
+			state['text'].append(data)
+	def entityDecl(*args):
+		# plistlib refuses them, no entity expansion
+		raise plistlib.InvalidFileException('XML entity declarations are not supported in plist files')
+	parser.StartElementHandler = startElement
+	parser.EndElementHandler = endElement
+	parser.CharacterDataHandler = characterData
+	parser.EntityDeclHandler = entityDecl
+	try:
+		for pos in range(0, len(buffer), chunk):
+			parser.Parse(buffer[pos:pos + chunk], False)
+		parser.Parse(b'', True)
+	except xmlKeysFound:
+		pass
+	if not state['dict']:
+		return None
+	prefix = buffer[:state['prefix']]
+	return { key: plistlib.loads(prefix + buffer[start:end] + b'</plist>') for key, ( start, end ) in ranges.items() }
+
+def isXML(buffer) -> bool:
+	# the UTF-16 and UTF-32 documents plistlib also accepts go through plistlib
+	head = buffer[:8]
+	if head.startswith(b'\xef\xbb\xbf'):
+		head = head[3:]
+	return head.startswith(b'<?xml') or head.startswith(b'<plist')
+
+def plistKeys(buffer, keys: Iterable[str]) -> dict:
+	# key -> value, for the requested keys the top dictionary has
+	keys = list(keys)
+	if buffer[:len(BINARY_HEADER)] == BINARY_HEADER:
+		values = binaryPlistReader(buffer).get(keys)
+	elif isXML(buffer):
+		values = xmlPlistKeys(buffer, keys)
+	else:
+		values = None
+	if values is None:
+		d = plistlib.loads(bytes(buffer))
+		values = { key: d[key] for key in keys if key in d }
+	return values
+
+def readPlistKeys(path: str, keys: Iterable[str]) -> dict:
+	with open(path, 'rb') as f:
+		if os.fstat(f.fileno()).st_size < len(BINARY_HEADER) + BINARY_TRAILER.size:
+			# mmap does not take empty files, too short for a binary plist anyway
+			return plistKeys(f.read(), keys)
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+			return plistKeys(buffer, keys)
+
+def main(argv):
+	if len(argv) < 3:
+		sys.exit('usage: {0} plistFile key [key ...]'.format(argv[0]))
+	start = time.perf_counter()
+	values = readPlistKeys(argv[1], argv[2:])
+	elapsed = time.perf_counter() - start
+	print(json.dumps(values, default=str))
+	print(f'{elapsed * 1000:.3f} ms', file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+KERN_PROCARGS2 blob parser, pure python with no sysctl involved so it can run on any platform against saved blobs.
+
+The blob layout
+
+- int32 (4 bytes) argc
+- null terminated string program path, padded with zeroes so it's always stored as a multiple of 8 bytes
+- as much null terminated strings as there are cmdline arguments, matching the argc value
+- a variable set of null terminated strings containing the environment variables formatted as VARIABLE_NAME=VARIABLE_VALUE,
+  ended by an empty string (the apple[] strings which follow are not reported)
+
+Strings are located with bytes.find, the parser only ever looks at the bytes the kernel returned.
+splitProcArgs2 stops before decoding, so callers filtering processes only decode the ones they keep.
+
+procArgsFixtures holds saved blobs, path padding, extra padding before argv, argc 0, empty arguments, invalid utf-8 and
+buffers cut in the middle of a string, with the parse expected for each in expected.json. --check parses them, and every
+truncation of them, which must parse without error to the same strings or fewer.
+
+    python3 procArgs.py procargs2.bin
+    python3 procArgs.py --check [fixturesDirectory]
+"""
+import json, os, struct, sys
+from typing import NamedTuple, Optional
+
+ARGC = struct.Struct('@i')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'procArgsFixtures')
+
+def decode(raw: bytes) -> str:
+    # invalid utf-8 is kept round-trippable instead of failing the whole process
+    return raw.decode('utf-8', errors='surrogateescape')
+
+class procArgs2Strings(NamedTuple):
+    argc: int
+    # None for the empty result case
+    program: Optional[bytes]
+    argv: list
+    env_variables: list
+
+def splitProcArgs2(view: memoryview) -> procArgs2Strings:
+    # view covers exactly the size returned by sysctl, strings are sliced out but not decoded
+    data = bytes(view)
+    end = len(data)
+    argc = ARGC.unpack_from(data)[0] if end >= ARGC.size else 0
+    argv = []
+    env_variables = []
+    idx = ARGC.size
+    #empty result case
+    if idx >= end or data[idx] == 0:
+        return procArgs2Strings(argc, None, argv, env_variables)
+    #program path, then its padding
+    nul = data.find(b'\0', idx)
+    if nul < 0:
+        nul = end
+    program = data[idx:nul]
+    # the path and its terminating zero are padded to a multiple of 8 bytes
+    idx = nul + 8 - (nul - idx) % 8
+    #argv, past any extra padding
+    if argc > 0:
+        while idx < end and data[idx] == 0:
+            idx += 1
+    while len(argv) < argc:
+        nul = data.find(b'\0', idx)
+        if nul < 0:
+            return procArgs2Strings(argc, program, argv, env_variables)
+        argv.append(data[idx:nul])
+        idx = nul + 1
+    #environment variables, up to the empty string
+    while idx < end:
+        nul = data.find(b'\0', idx)
+        if nul <= idx:
+            break
+        env_variables.append(data[idx:nul])
+        idx = nul + 1
+    return procArgs2Strings(argc, program, argv, env_variables)
+
+def decodeProcArgs2(strings: procArgs2Strings) -> dict:
+    procArg2DataStruct = {
+        "argc" : strings.argc,
+        "argv" : [decode(arg) for arg in strings.argv],
+        "env_variables" : [decode(env) for env in strings.env_variables]
+    }
+    if strings.program is not None:
+        procArg2DataStruct['program'] = decode(strings.program)
+    return procArg2DataStruct
+
+def parseProcArgs2(view: memoryview) -> dict:
+    return decodeProcArgs2(splitProcArgs2(view))
+
+def readProcArgs2(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def checkFixtures(directory: str = FIXTURES_DIR) -> int:
+    # number of fixtures checked, AssertionError on the first parse which differs from expected.json
+    with open(os.path.join(directory, 'expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    for name, procArgs2 in expected.items():
+        blob = readProcArgs2(os.path.join(directory, name))
+        parsed = parseProcArgs2(memoryview(blob))
+        assert parsed == procArgs2, f'{name} parsed as {parsed!r}, expected {procArgs2!r}'
+        for size in range(len(blob)):
+            truncated = parseProcArgs2(memoryview(blob)[:size])
+            for key in ( 'argv', 'env_variables' ):
+                assert parsed[key][:len(truncated[key])] == truncated[key], f'{name} cut at {size} bytes parsed as {truncated!r}'
+    return len(expected)
+
+def main(argv):
+    if len(argv) in ( 2, 3 ) and argv[1] == '--check':
+        print(f'{checkFixtures(*argv[2:])} procargs2 fixtures: ok')
+        return
+    if len(argv) != 2:
+        sys.exit('usage: {0} procargs2File | --check [fixturesDirectory]'.format(argv[0]))
+    print(json.dumps(parseProcArgs2(memoryview(readProcArgs2(argv[1]))), indent=3))
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -11,9 +11,11 @@ It uses the KERN_PROCARGS2 sysctl call, which is unique to macOS and uses a rath
 - as much null terminated strings as there are cmdline arguments, matching the argc value
 - a variable set of null terminated strings containing the environment variables formatted as VARIABLE_NAME=VARIABLE_VALUE
 
+The blob itself is parsed by procArgs.parseProcArgs2, which runs on any platform.
 """
 import sys, json
-from ctypes import CDLL, create_string_buffer, c_int, c_int32, c_size_t, sizeof, byref, memmove, pointer 
+from ctypes import CDLL, Array, create_string_buffer, c_int, c_size_t, sizeof, byref
+from procArgs import parseProcArgs2
 
 # Loading C library functions through ctypes
 
@@ -33,51 +35,25 @@ def get_ARGMAX_c_size_t() -> c_size_t:
     result = libc.sysctl(SYSCTL_CALL, ARGMAX_ARGCOUNT, byref(ARGMAX), byref(c_size_t(sizeof(ARGMAX))), None, c_size_t(0))
     return c_size_t(ARGMAX.value)
 
-def progArgsByPid(PID: int) -> dict:
+def procArgs2Into(PID: int, BLOB: Array) -> memoryview:
+    # BLOB is at least ARGMAX bytes, it can be reused from one call to the next, the returned view covers what the kernel wrote
     SYSCTL_CALL = ( c_int * PROCARG2_ARGCOUNT )( CTL_KERN, KERN_PROCARGS2, PID )
-    BLOB = create_string_buffer(ARGMAX.value)
-    result = libc.sysctl(SYSCTL_CALL, PROCARG2_ARGCOUNT, byref(BLOB), byref(ARGMAX), None, c_size_t(0))
+    # sysctl writes the returned size back, ARGMAX itself is left alone for the next call
+    BLOB_SIZE = c_size_t(sizeof(BLOB))
+    result = libc.sysctl(SYSCTL_CALL, PROCARG2_ARGCOUNT, byref(BLOB), byref(BLOB_SIZE), None, c_size_t(0))
     if result == 0:
-        byteArray = BLOB.raw
-        argCount = c_int32()
-        memmove(pointer(argCount), byteArray, sizeof(argCount))
-        idx = str_start = sizeof(argCount)
-        procArg2DataStruct = {
-            "argc" : argCount.value,
-            "argv" : [],
-            "env_variables" : []
-        }
-        #empty result case
-        if byteArray[idx] == 0:
-            return procArg2DataStruct
-        #scanning for program path
-        while True:
-            if byteArray[idx] == 0:
-                procArg2DataStruct['program'] = byteArray[str_start:idx].decode('utf-8')
-                offset = 8 - ( len(procArg2DataStruct['program']) % 8 )
-                str_start = idx = idx + offset
-                break
-            idx += 1
-        #scanning for argv
-        while argCount.value != 0:
-            if byteArray[idx] == 0 and byteArray[idx-1] != 0:
-                procArg2DataStruct['argv'].append(byteArray[str_start:idx].decode('utf-8'))
-                argCount.value -= 1
-            elif byteArray[idx] != 0 and byteArray[idx-1] == 0:
-                str_start = idx
-            idx += 1
-        # environment variables
-        while idx < len(byteArray):
-            if byteArray[idx] == 0 and byteArray[idx-1] == 0:
-                break
-            elif byteArray[idx] == 0 and byteArray[idx-1] != 0:
-                procArg2DataStruct['env_variables'].append(byteArray[str_start:idx].decode('utf-8'))
-            elif byteArray[idx] != 0 and byteArray[idx-1] == 0:
-                str_start = idx
-            idx += 1
-        return procArg2DataStruct
-    else:
+        return memoryview(BLOB)[:BLOB_SIZE.value]
+    return None
+
+def progArgsInto(PID: int, BLOB: Array) -> dict:
+    view = procArgs2Into(PID, BLOB)
+    return None if view is None else parseProcArgs2(view)
+
+def progArgsByPid(PID: int) -> dict:
+    progArgs = progArgsInto(PID, create_string_buffer(ARGMAX.value))
+    if progArgs is None:
         print('sysctl call failure')
+    return progArgs
 
 ARGMAX = get_ARGMAX_c_size_t()
 
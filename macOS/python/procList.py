@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Process list from the KERN_PROC / KERN_PROC_ALL sysctl call, an array of struct kinfo_proc.
+
+struct kinfo_proc is 648 bytes on 64 bits macOS (x86_64 and arm64), only the members below are decoded
+
+- kp_proc.p_starttime (struct timeval at offset 0, the p_un union), p_flag, p_stat, p_pid, p_comm
+- kp_eproc.e_pcred.p_ruid, kp_eproc.e_ucred.cr_uid, kp_eproc.e_ppid, kp_eproc.e_pgid
+
+The whole array is decoded with a single struct.iter_unpack over the returned bytes, parseKinfoProcs is pure python
+and runs on any platform against saved blobs.
+
+    python3 procList.py
+"""
+import ctypes, errno, functools, struct, sys
+from typing import NamedTuple
+
+CTL_KERN = 1
+KERN_PROC = 14
+KERN_PROC_ALL = 0
+KERN_PROC_ARGCOUNT = 3
+
+KINFO_PROC_SIZE = 648
+# offset in struct kinfo_proc, struct format
+KINFO_PROC_FIELDS = {
+    'start_sec': ( 0, 'q' ),
+    'start_usec': ( 8, 'i' ),
+    'flag': ( 32, 'i' ),
+    'stat': ( 36, 'B' ),
+    'pid': ( 40, 'i' ),
+    'comm': ( 243, '17s' ),
+    'ruid': ( 392, 'I' ),
+    'uid': ( 420, 'I' ),
+    'ppid': ( 560, 'i' ),
+    'pgid': ( 564, 'i' )
+}
+# the process list is over-allocated by this many entries, processes spawned between the two sysctl calls still fit
+KINFO_PROC_SLACK = 64
+
+def kinfoProcStruct(fields: dict = KINFO_PROC_FIELDS, size: int = KINFO_PROC_SIZE) -> tuple[list, struct.Struct]:
+    # one format for the members we want, everything else skipped as pad bytes
+    fmt = '='
+    idx = 0
+    names = []
+    for name, ( offset, code ) in sorted(fields.items(), key=lambda field: field[1][0]):
+        fmt += f'{offset - idx}x{code}'
+        idx = offset + struct.calcsize('=' + code)
+        names.append(name)
+    fmt += f'{size - idx}x'
+    return names, struct.Struct(fmt)
+
+KINFO_PROC_NAMES, KINFO_PROC = kinfoProcStruct()
+assert KINFO_PROC.size == KINFO_PROC_SIZE
+
+class kinfoProc(NamedTuple):
+    pid: int
+    ppid: int
+    pgid: int
+    uid: int
+    ruid: int
+    flag: int
+    stat: int
+    # p_starttime in seconds since the epoch, with ( pid, start ) a process identity pid reuse cannot fool
+    start: float
+    comm: str
+
+def kinfoProcFromValues(values: tuple) -> kinfoProc:
+    f = dict(zip(KINFO_PROC_NAMES, values))
+    return kinfoProc(f['pid'], f['ppid'], f['pgid'], f['uid'], f['ruid'], f['flag'], f['stat'],
+                    f['start_sec'] + f['start_usec'] / 1e6, f['comm'].split(b'\0', 1)[0].decode('utf-8', errors='replace'))
+
+def parseKinfoProcs(view: memoryview) -> list:
+    # view covers exactly the size returned by sysctl, a whole number of kinfo_proc
+    view = memoryview(view).cast('B')
+    view = view[:len(view) - len(view) % KINFO_PROC_SIZE]
+    return [kinfoProcFromValues(values) for values in KINFO_PROC.iter_unpack(view)]
+
+@functools.lru_cache(maxsize=None)
+def loadLibc() -> ctypes.CDLL:
+    return ctypes.CDLL('libc.dylib', use_errno=True)
+
+def readKinfoProcs() -> memoryview:
+    libc = loadLibc()
+    SYSCTL_CALL = ( ctypes.c_int * KERN_PROC_ARGCOUNT )( CTL_KERN, KERN_PROC, KERN_PROC_ALL )
+    while True:
+        size = ctypes.c_size_t()
+        if libc.sysctl(SYSCTL_CALL, KERN_PROC_ARGCOUNT, None, ctypes.byref(size), None, ctypes.c_size_t(0)) != 0:
+            raise OSError(ctypes.get_errno(), 'sysctl KERN_PROC_ALL failed')
+        size.value += KINFO_PROC_SLACK * KINFO_PROC_SIZE
+        BLOB = ctypes.create_string_buffer(size.value)
+        if libc.sysctl(SYSCTL_CALL, KERN_PROC_ARGCOUNT, ctypes.byref(BLOB), ctypes.byref(size), None, ctypes.c_size_t(0)) == 0:
+            return memoryview(BLOB)[:size.value]
+        if ctypes.get_errno() != errno.ENOMEM:
+            raise OSError(ctypes.get_errno(), 'sysctl KERN_PROC_ALL failed')
+        # more processes than the slack, asking for the size again
+
+def listProcs() -> list:
+    return parseKinfoProcs(readKinfoProcs())
+
+def main(argv):
+    for proc in listProcs():
+        print(f'{proc.pid:>6} {proc.ppid:>6} {proc.uid:>5} {proc.comm}')
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+pgrep like queries over the command lines and environment variables of every process, streamed out as NDJSON.
+
+Predicates, all of them must match
+
+- program / argv substring, any argv string containing it
+- program / argv / env regex, searched in each string
+- env KEY, the variable is set, env KEY=VALUE, the variable is set to exactly that value, env KEY= to an empty one
+
+Predicates are evaluated on the raw KERN_PROCARGS2 strings, right after they are sliced out of the blob in the worker
+thread which read them, processes which do not match are dropped there without decoding anything.
+Every match is written as one JSON line { "pid": ..., "argc": ..., "argv": [...], "env_variables": [...], "program": ... }
+as soon as it is known.
+
+    sudo python3 procQuery.py --env HTTPS_PROXY
+    sudo python3 procQuery.py --argv=--remote-debugging-port
+"""
+import argparse, json, re, sys
+from typing import Callable, Iterable, NamedTuple, Optional, TextIO
+from procArgs import procArgs2Strings, splitProcArgs2, decodeProcArgs2
+from procSnapshot import SNAPSHOT_WORKERS, iterProcArgs
+
+SECTIONS = ( 'program', 'argv', 'env' )
+
+class procPredicate(NamedTuple):
+    # section is 'program', 'argv' or 'env', kind is 'substring', 'regex', 'keyset' or 'keyvalue'
+    section: str
+    kind: str
+    pattern: bytes
+    regex: Optional[re.Pattern] = None
+
+def encode(text: str) -> bytes:
+    return text.encode('utf-8', errors='surrogateescape')
+
+def substringPredicate(section: str, text: str) -> procPredicate:
+    return procPredicate(section, 'substring', encode(text))
+
+def regexPredicate(section: str, text: str) -> procPredicate:
+    return procPredicate(section, 'regex', encode(text), re.compile(encode(text)))
+
+def keyValuePredicate(text: str) -> procPredicate:
+    # KEY matches any value, KEY=VALUE only that exact value, KEY= only the empty value
+    if '=' not in text:
+        return procPredicate('env', 'keyset', encode(text + '='))
+    return procPredicate('env', 'keyvalue', encode(text))
+
+def sectionStrings(strings: procArgs2Strings, section: str) -> list:
+    if section == 'program':
+        return [] if strings.program is None else [strings.program]
+    return strings.argv if section == 'argv' else strings.env_variables
+
+def matchPredicate(predicate: procPredicate, strings: procArgs2Strings) -> bool:
+    candidates = sectionStrings(strings, predicate.section)
+    if predicate.kind == 'substring':
+        return any(predicate.pattern in s for s in candidates)
+    if predicate.kind == 'regex':
+        return any(predicate.regex.search(s) for s in candidates)
+    # keyset, 'KEY=' is a prefix match, keyvalue, 'KEY=VALUE' or 'KEY=' an exact one
+    if predicate.kind == 'keyset':
+        return any(s.startswith(predicate.pattern) for s in candidates)
+    return predicate.pattern in candidates
+
+class procQuery:
+    def __init__(self, predicates: Iterable[procPredicate]):
+        self.predicates = list(predicates)
+    def match(self, strings: procArgs2Strings) -> bool:
+        return all(matchPredicate(predicate, strings) for predicate in self.predicates)
+    def filter(self, view: memoryview) -> Optional[dict]:
+        # the decoded process when it matches, None otherwise, no string gets decoded for the ones dropped
+        if view is None:
+            return None
+        strings = splitProcArgs2(view)
+        return decodeProcArgs2(strings) if self.match(strings) else None
+    def reader(self, raw: Callable) -> Callable:
+        # wraps a raw read(pid, buffer) -> memoryview into one returning the filtered process, for iterProcArgs
+        return lambda pid, buf: self.filter(raw(pid, buf))
+
+def streamMatches(results: Iterable[tuple], out: TextIO = sys.stdout) -> int:
+    # results are ( pid, filtered process or None ), one line per match, flushed right away
+    matches = 0
+    for pid, progArgs in results:
+        if progArgs is None:
+            continue
+        out.write(json.dumps({ 'pid': pid, **progArgs }) + '\n')
+        out.flush()
+        matches += 1
+    return matches
+
+def queryArgs(args: argparse.Namespace) -> procQuery:
+    predicates = []
+    for section in SECTIONS:
+        if section != 'env':
+            predicates += [substringPredicate(section, text) for text in getattr(args, section) or []]
+        predicates += [regexPredicate(section, text) for text in getattr(args, f'{section}_regex') or []]
+    predicates += [keyValuePredicate(text) for text in args.env or []]
+    return procQuery(predicates)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Lists the processes whose command line and environment match every predicate, as NDJSON')
+    parser.add_argument('--program', action='append', metavar='TEXT', help='program path containing TEXT')
+    parser.add_argument('--program-regex', action='append', metavar='REGEX', help='program path matching REGEX')
+    parser.add_argument('--argv', action='append', metavar='TEXT', help='an argument containing TEXT')
+    parser.add_argument('--argv-regex', action='append', metavar='REGEX', help='an argument matching REGEX')
+    parser.add_argument('--env', action='append', metavar='KEY[=VALUE]', help='environment variable KEY set, or set to VALUE')
+    parser.add_argument('--env-regex', action='append', metavar='REGEX', help='an environment variable KEY=VALUE string matching REGEX')
+    parser.add_argument('-j', '--workers', type=int, default=SNAPSHOT_WORKERS, help='sysctl worker threads')
+    args = parser.parse_args(argv[1:])
+    from procArgsByPid import procArgs2Into
+    query = queryArgs(args)
+    matches = streamMatches(iterProcArgs(workers=args.workers, read=query.reader(procArgs2Into)))
+    sys.exit(0 if matches else 1)
+
+if __name__ == '__main__':
+    main(sys.argv)
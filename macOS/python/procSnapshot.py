@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Whole system snapshot of the process command lines and environment variables, in a single run.
+
+- the PIDs come from one KERN_PROC_ALL sysctl call (procList)
+- libc and KERN_ARGMAX are loaded once, the KERN_PROCARGS2 buffers come from a pool of preallocated ARG_MAX buffers,
+  one per worker, and are reused from one PID to the next
+- the sysctl calls and the parsing are spread over a thread pool, ctypes releases the GIL during the sysctl calls
+
+The result is a single dictionary keyed by PID, with the progArgsByPid structure as values,
+None for the processes which could not be read (exited meanwhile, or not ours without root).
+
+    sudo python3 procSnapshot.py [workers]
+"""
+import json, queue, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from ctypes import Array, create_string_buffer
+from typing import Callable, Iterable, Iterator
+from procList import listProcs
+
+SNAPSHOT_WORKERS = 8
+
+class bufferPool:
+    def __init__(self, count: int, size: int):
+        self.free = queue.SimpleQueue()
+        for _ in range(count):
+            self.free.put(create_string_buffer(size))
+    @contextmanager
+    def buffer(self) -> Iterator[Array]:
+        # blocks while every buffer is in use
+        buf = self.free.get()
+        try:
+            yield buf
+        finally:
+            self.free.put(buf)
+
+class procArgsReader:
+    # the buffer pool and the worker threads, kept from one batch of PIDs to the next
+    def __init__(self, workers: int = SNAPSHOT_WORKERS, read: Callable = None, buffer_size: int = None):
+        # read(pid, buffer) -> anything copied out of the buffer, progArgsInto by default
+        if read is None:
+            from procArgsByPid import progArgsInto
+            read = progArgsInto
+        if buffer_size is None:
+            from procArgsByPid import ARGMAX
+            buffer_size = ARGMAX.value
+        self.read = read
+        self.pool = bufferPool(workers, buffer_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+    def __enter__(self) -> 'procArgsReader':
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+    def close(self) -> None:
+        self.executor.shutdown()
+    def readPid(self, pid: int):
+        # whatever read keeps from the buffer must be copied out before it goes back to the pool
+        with self.pool.buffer() as buf:
+            return self.read(pid, buf)
+    def iter(self, pids: Iterable[int]) -> Iterator[tuple]:
+        # ( pid, read(pid, buffer) ) in PID order, as soon as they are read
+        yield from zip(pids, self.executor.map(self.readPid, pids))
+
+def iterProcArgs(pids: Iterable[int] = None, workers: int = SNAPSHOT_WORKERS, read: Callable = None, buffer_size: int = None) -> Iterator[tuple]:
+    if pids is None:
+        pids = [proc.pid for proc in listProcs()]
+    pids = list(pids)
+    with procArgsReader(max(1, min(workers, len(pids))), read, buffer_size) as reader:
+        yield from reader.iter(pids)
+
+def procArgsSnapshot(pids: Iterable[int] = None, workers: int = SNAPSHOT_WORKERS, read: Callable = None, buffer_size: int = None) -> dict:
+    return dict(iterProcArgs(pids, workers, read, buffer_size))
+
+def main(argv):
+    if len(argv) > 2:
+        sys.exit('usage: {0} [workers]'.format(argv[0]))
+    workers = int(argv[1]) if len(argv) == 2 else SNAPSHOT_WORKERS
+    start = time.perf_counter()
+    snapshot = procArgsSnapshot(workers=workers)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(snapshot, indent=3))
+    unreadable = sum(progArgs is None for progArgs in snapshot.values())
+    print(f'{len(snapshot)} processes, {unreadable} unreadable, {elapsed * 1000:.1f} ms', file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv)
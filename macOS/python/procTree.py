@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Process table and tree index built from the KERN_PROC_ALL kinfo_proc array, for ancestry and descendant queries.
+
+The table is column oriented, one array.array per kinfo_proc member (pid, ppid, uid, start ...), rows in the kernel order.
+Two indexes sit next to it
+- children : rows sorted by parent PID, a parent's children are the slice bisect finds in the sorted parent PIDs
+- uid : uid -> rows
+
+Command lines are not part of the table, they are read through KERN_PROCARGS2 (progArgsInto) for the rows a query
+returns, once per row, everything else never costs a sysctl call.
+Tables decode from a kinfo_proc blob, saved blobs can be queried on any platform.
+
+procTreeFixtures holds a kinfo_proc array blob, kernel_task and launchd, a login shell chain, a full length and a non utf-8
+p_comm, a process whose parent is gone and a partial kinfo_proc at the end, with in expected.json the processes and the
+children, descendants, ancestry and uid answers for each PID. --check decodes it and compares.
+
+    sudo python3 procTree.py ancestry|descendants PID [kinfoProcBlobFile]
+    python3 procTree.py --check [fixturesDirectory]
+"""
+import array, json, os, sys
+from bisect import bisect_left, bisect_right
+from collections import deque
+from ctypes import create_string_buffer
+from typing import Callable, Iterator
+from procList import KINFO_PROC, KINFO_PROC_NAMES, KINFO_PROC_SIZE, kinfoProc, kinfoProcFromValues, parseKinfoProcs, readKinfoProcs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'procTreeFixtures')
+COLUMNS = { 'pid': 'i', 'ppid': 'i', 'pgid': 'i', 'uid': 'I', 'ruid': 'I', 'flag': 'i', 'stat': 'B', 'start_sec': 'q', 'start_usec': 'i' }
+
+class procTable:
+    def __init__(self, read: Callable = None, buffer_size: int = None):
+        # read(pid, buffer) -> progArgsByPid structure, progArgsInto with an ARG_MAX buffer by default
+        self.read = read
+        self.bufferSize = buffer_size
+        self.buffer = None
+        self.columns = { name: array.array(code) for name, code in COLUMNS.items() }
+        self.comm = []
+        self.rows = {}
+        self.children = array.array('i')
+        self.childParents = array.array('i')
+        self.byUid = {}
+        self.args = {}
+    @classmethod
+    def fromBlob(cls, view: memoryview, read: Callable = None, buffer_size: int = None) -> 'procTable':
+        table = cls(read, buffer_size)
+        view = memoryview(view).cast('B')
+        view = view[:len(view) - len(view) % KINFO_PROC_SIZE]
+        appends = [( KINFO_PROC_NAMES.index(name), column.append ) for name, column in table.columns.items()]
+        comm = KINFO_PROC_NAMES.index('comm')
+        for values in KINFO_PROC.iter_unpack(view):
+            for idx, append in appends:
+                append(values[idx])
+            table.comm.append(values[comm])
+        table.index()
+        return table
+    @classmethod
+    def current(cls, read: Callable = None, buffer_size: int = None) -> 'procTable':
+        return cls.fromBlob(readKinfoProcs(), read, buffer_size)
+    def index(self) -> None:
+        pids = self.columns['pid']
+        ppids = self.columns['ppid']
+        self.rows = { pid: row for row, pid in enumerate(pids) }
+        # rows sorted by parent, the children of a parent are one contiguous slice
+        self.children = array.array('i', sorted(range(len(pids)), key=ppids.__getitem__))
+        self.childParents = array.array('i', ( ppids[row] for row in self.children ))
+        self.byUid = {}
+        for row, uid in enumerate(self.columns['uid']):
+            self.byUid.setdefault(uid, array.array('i')).append(row)
+    def __len__(self) -> int:
+        return len(self.columns['pid'])
+    def __contains__(self, pid: int) -> bool:
+        return pid in self.rows
+    def proc(self, pid: int) -> kinfoProc:
+        row = self.rows[pid]
+        return kinfoProcFromValues(tuple(self.comm[row] if name == 'comm' else self.columns[name][row] for name in KINFO_PROC_NAMES))
+    def childrenOf(self, pid: int) -> list:
+        first = bisect_left(self.childParents, pid)
+        last = bisect_right(self.childParents, pid)
+        pids = self.columns['pid']
+        # launchd and kernel_task are their own parents' children otherwise
+        return [pids[row] for row in self.children[first:last] if pids[row] != pid]
+    def descendants(self, pid: int) -> Iterator[int]:
+        # breadth first, pid excluded
+        queue = deque(self.childrenOf(pid))
+        seen = set(queue)
+        while queue:
+            child = queue.popleft()
+            yield child
+            for grandchild in self.childrenOf(child):
+                if grandchild not in seen:
+                    seen.add(grandchild)
+                    queue.append(grandchild)
+    def ancestry(self, pid: int) -> list:
+        # pid then its parent, up to the root, stops at a PID the table does not have
+        chain = []
+        while pid in self.rows and pid not in chain:
+            chain.append(pid)
+            pid = self.columns['ppid'][self.rows[pid]]
+        return chain
+    def processesOf(self, uid: int) -> list:
+        pids = self.columns['pid']
+        return [pids[row] for row in self.byUid.get(uid, ())]
+    def argsOf(self, pid: int) -> dict:
+        # read on first use only, one shared buffer
+        row = self.rows[pid]
+        if row not in self.args:
+            if self.read is None:
+                from procArgsByPid import progArgsInto
+                self.read = progArgsInto
+            if self.buffer is None:
+                if self.bufferSize is None:
+                    from procArgsByPid import ARGMAX
+                    self.bufferSize = ARGMAX.value
+                self.buffer = create_string_buffer(self.bufferSize)
+            self.args[row] = self.read(pid, self.buffer)
+        return self.args[row]
+    def describe(self, pid: int) -> dict:
+        proc = self.proc(pid)
+        record = { 'pid': proc.pid, 'ppid': proc.ppid, 'uid': proc.uid, 'start': proc.start, 'comm': proc.comm }
+        args = self.argsOf(pid)
+        if args is not None:
+            record['argv'] = args['argv']
+        return record
+
+def treeAnswers(table: procTable) -> dict:
+    # everything a fixture records, PIDs as strings like JSON keys
+    pids = table.columns['pid']
+    return {
+        'procs': [table.proc(pid)._asdict() for pid in pids],
+        'children': { str(pid): table.childrenOf(pid) for pid in pids },
+        'descendants': { str(pid): list(table.descendants(pid)) for pid in pids },
+        'ancestry': { str(pid): table.ancestry(pid) for pid in pids },
+        'uids': { str(uid): table.processesOf(uid) for uid in sorted(table.byUid) }
+    }
+
+def checkFixtures(directory: str = FIXTURES_DIR) -> int:
+    # number of fixtures checked, AssertionError on the first answer which differs from expected.json
+    with open(os.path.join(directory, 'expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    for name, answers in expected.items():
+        with open(os.path.join(directory, name), 'rb') as f:
+            blob = f.read()
+        got = treeAnswers(procTable.fromBlob(blob, lambda pid, buf: None, 0))
+        for key, value in answers.items():
+            assert got[key] == value, f'{name} {key} is {got[key]!r}, expected {value!r}'
+        # the column table and the plain decoding agree
+        assert [proc._asdict() for proc in parseKinfoProcs(blob)] == answers['procs'], f'{name} parseKinfoProcs differs'
+    return len(expected)
+
+def main(argv):
+    if len(argv) in ( 2, 3 ) and argv[1] == '--check':
+        print(f'{checkFixtures(*argv[2:])} kinfo_proc fixtures: ok')
+        return
+    if len(argv) not in ( 3, 4 ) or argv[1] not in ( 'ancestry', 'descendants' ):
+        sys.exit('usage: {0} ancestry|descendants PID [kinfoProcBlobFile] | --check [fixturesDirectory]'.format(argv[0]))
+    if len(argv) == 4:
+        # a saved blob, the processes are not ours to read
+        with open(argv[3], 'rb') as f:
+            table = procTable.fromBlob(f.read(), lambda pid, buf: None, 0)
+    else:
+        table = procTable.current()
+    pid = int(argv[2])
+    pids = table.ancestry(pid) if argv[1] == 'ancestry' else list(table.descendants(pid))
+    for pid in pids:
+        print(json.dumps(table.describe(pid)))
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Incremental watch of the processes command lines and environment variables, reported as spawn / exit deltas.
+
+Every poll lists the processes with one KERN_PROC_ALL call, each process is identified by ( pid, p_starttime ) so a
+recycled PID shows up as an exit and a spawn. KERN_PROCARGS2 is only read for the identities not seen before, through
+progArgsInto, the ones which disappeared are evicted from the cache. The cost of a poll follows the process churn,
+not the process count.
+
+Events are streamed out as NDJSON, the first poll reports every running process as a spawn.
+
+    sudo python3 procWatch.py [interval]
+"""
+import json, sys, time
+from typing import Callable, NamedTuple, Optional
+from procList import kinfoProc, listProcs
+from procSnapshot import SNAPSHOT_WORKERS, procArgsReader
+
+WATCH_INTERVAL = 2.0
+
+class procEvent(NamedTuple):
+    # 'spawn' or 'exit'
+    kind: str
+    proc: kinfoProc
+    # the progArgsByPid structure, None when it could not be read
+    args: Optional[dict]
+
+class procWatch:
+    def __init__(self, list_procs: Callable = listProcs, reader: procArgsReader = None):
+        # list_procs() -> [kinfoProc], reader reads the KERN_PROCARGS2 of the new processes
+        self.list_procs = list_procs
+        self.reader = procArgsReader(SNAPSHOT_WORKERS) if reader is None else reader
+        # ( pid, start ) -> procEvent of its spawn
+        self.cache = {}
+    def close(self) -> None:
+        self.reader.close()
+    def poll(self) -> list:
+        current = { ( proc.pid, proc.start ): proc for proc in self.list_procs() }
+        events = []
+        for key in [key for key in self.cache if key not in current]:
+            spawn = self.cache.pop(key)
+            events.append(procEvent('exit', spawn.proc, spawn.args))
+        spawned = [proc for key, proc in current.items() if key not in self.cache]
+        for proc, ( _, args ) in zip(spawned, self.reader.iter([proc.pid for proc in spawned])):
+            event = procEvent('spawn', proc, args)
+            self.cache[( proc.pid, proc.start )] = event
+            events.append(event)
+        return events
+
+def eventJSON(event: procEvent) -> str:
+    record = { 'event': event.kind, 'pid': event.proc.pid, 'ppid': event.proc.ppid, 'uid': event.proc.uid,
+                'start': event.proc.start, 'comm': event.proc.comm }
+    if event.args is not None:
+        record.update(event.args)
+    return json.dumps(record)
+
+def main(argv):
+    if len(argv) > 2:
+        sys.exit('usage: {0} [interval]'.format(argv[0]))
+    interval = float(argv[1]) if len(argv) == 2 else WATCH_INTERVAL
+    watch = procWatch()
+    try:
+        while True:
+            for event in watch.poll():
+                print(eventJSON(event))
+            sys.stdout.flush()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watch.close()
+
+if __name__ == '__main__':
+    main(sys.argv)
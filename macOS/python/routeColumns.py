@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Columnar export of a NET_RT_DUMP blob, for loading the routing tables of a whole fleet and filtering them in bulk.
+
+The blob is decoded into a NumPy structured array, one row per route :
+
+- family, prefix, index (interface index), flags, addrs, the rt_msghdr offset in the source blob
+- dst, gateway and mask as fixed width 16 bytes address fields (IPv4 addresses use the first 4 bytes),
+  gateway_family tells AF_INET / AF_INET6 / AF_LINK gateways apart, AF_LINK gateways store their link layer address
+- scope and gateway_scope, the IPv6 scope of dst and gateway, the one the kernel embeds in link-local and
+  interface-local / link-local multicast addresses is moved there, like getnameinfo and routeSockaddr do
+- every rt_metrics member (mtu, hopcount, expire ...)
+
+Only the walk from one message to the next is done in Python, headers are gathered with a single fancy indexing
+of the blob and the sockaddrs are located with one vectorized pass per RTA bit, so filters such as
+'GATEWAY and not GLOBAL' run as boolean masks over the whole table :
+	routes[flagMask(routes, RTF.GATEWAY, RTF.GLOBAL)]
+
+Arrays are saved as .npy files, which can be memory-mapped back with loadColumns(path).
+
+	python3 routeColumns.py rt_dump.bin routes.npy
+
+This program requires the numpy module.
+"""
+import sys
+import numpy as np
+from routeDump import RTF, AF, RTA, RTAX_MAX, RTM_VERSION, RT_MSGHDR_SIZE, RT_MSGHDR_TYPES, RT_MSGLEN, byteView, readRouteDump
+
+METRICS = ['locks', 'mtu', 'hopcount', 'expire', 'recvpipe', 'sendpipe', 'ssthresh', 'rtt', 'rttvar', 'pksent', 'state']
+
+# struct rt_msghdr, align=True gives the same native layout as the ctypes rt_msg struct
+RT_MSGHDR_DTYPE = np.dtype([('msglen', 'u2'), ('version', 'u1'), ('type', 'u1'), ('index', 'u2'),
+							('flags', 'i4'), ('addrs', 'i4'), ('pid', 'u4'), ('seq', 'i4'), ('errno', 'i4'),
+							('use', 'i4'), ('inits', 'u4')] +
+							[(m, 'i4' if m == 'expire' else 'u4') for m in METRICS] +
+							[('filler', 'u4', (3,))], align=True)
+assert RT_MSGHDR_DTYPE.itemsize == RT_MSGHDR_SIZE
+
+ROUTE_DTYPE = np.dtype([('offset', 'u4'), ('family', 'u1'), ('prefix', 'u1'), ('index', 'u2'),
+						('flags', 'u4'), ('addrs', 'u4'),
+						('dst', 'u1', (16,)), ('gateway', 'u1', (16,)), ('mask', 'u1', (16,)),
+						('gateway_family', 'u1'), ('scope', 'u4'), ('gateway_scope', 'u4')] +
+						[(m, 'i4' if m == 'expire' else 'u4') for m in METRICS])
+
+# where the address starts in a sockaddr_in / sockaddr_in6, and how long it is
+ADDRESS_LAYOUT = { AF.INET: ( 4, 4 ), AF.INET6: ( 8, 16 ) }
+SOCKADDR_DL_HEADER = 8
+SIN6_SCOPE_ID_OFFSET = 24
+
+def messageOffsets(view: memoryview) -> np.ndarray:
+	# the one sequential part, each message length tells where the next one starts
+	offsets = []
+	idx = 0
+	end = len(view)
+	while idx + RT_MSGHDR_SIZE <= end:
+		msglen, = RT_MSGLEN.unpack_from(view, idx)
+		if msglen == 0 or idx + msglen > end:
+			break
+		if view[idx + 3] in RT_MSGHDR_TYPES and view[idx + 2] == RTM_VERSION and msglen >= RT_MSGHDR_SIZE:
+			offsets.append(idx)
+		idx += msglen
+	return np.asarray(offsets, dtype=np.int64)
+
+def gather(raw: np.ndarray, pos: np.ndarray, sa_len: np.ndarray, start, width: int) -> np.ndarray:
+	# width bytes from pos + start for every row, bytes past sa_len (compressed netmasks) read as zeroes
+	cols = np.asarray(start).reshape(-1, 1) + np.arange(width)
+	idx = np.minimum(pos[:, None] + cols, len(raw) - 1)
+	return np.where(cols < sa_len[:, None], raw[idx], 0).astype(np.uint8)
+
+def embeddedScope(addresses: np.ndarray) -> np.ndarray:
+	# fe80::/10 link-local, ff01::/16 interface-local and ff02::/16 link-local multicast addresses with a scope in their
+	# second 16 bits word
+	linkLocal = (addresses[:, 0] == 0xfe) & ((addresses[:, 1] & 0xc0) == 0x80)
+	multicast = (addresses[:, 0] == 0xff) & np.isin(addresses[:, 1] & 0x0f, ( 0x01, 0x02 ))
+	return (linkLocal | multicast) & ((addresses[:, 2] | addresses[:, 3]) != 0)
+
+def moveScope(raw: np.ndarray, addresses: np.ndarray, scopes: np.ndarray, sa_pos: np.ndarray, sa_len: np.ndarray, rows: np.ndarray) -> None:
+	# sin6_scope_id of the AF_INET6 rows, unless the kernel embedded the scope in the address, then it is cleared from it
+	scopes[rows] = gather(raw, sa_pos[rows], sa_len[rows], SIN6_SCOPE_ID_OFFSET, 4).copy().view(np.uint32).reshape(-1)
+	rows = rows & embeddedScope(addresses)
+	scopes[rows] = addresses[rows, 2].astype(np.uint32) << 8 | addresses[rows, 3]
+	addresses[rows, 2:4] = 0
+
+def routeColumns(buf, size: int = None) -> np.ndarray:
+	raw = np.frombuffer(byteView(buf, size), dtype=np.uint8)
+	offsets = messageOffsets(byteView(buf, size))
+	n = len(offsets)
+	routes = np.zeros(n, dtype=ROUTE_DTYPE)
+	if n == 0:
+		return routes
+	hdr = raw[offsets[:, None] + np.arange(RT_MSGHDR_SIZE)].copy().view(RT_MSGHDR_DTYPE).reshape(n)
+	routes['offset'] = offsets
+	routes['index'] = hdr['index']
+	routes['flags'] = hdr['flags'].astype(np.uint32)
+	routes['addrs'] = hdr['addrs'].astype(np.uint32)
+	for m in METRICS:
+		routes[m] = hdr[m]
+	# locating the sockaddrs, one vectorized step per RTA bit, absent ones do not move the position
+	addrs = hdr['addrs'].astype(np.int64)
+	ends = offsets + hdr['msglen']
+	pos = offsets + RT_MSGHDR_SIZE
+	sockaddrs = {}
+	for bit in range(RTAX_MAX):
+		present = ((addrs >> bit) & 1).astype(bool) & (pos < ends)
+		sa_len = np.where(present, raw[np.minimum(pos, len(raw) - 1)], 0).astype(np.int64)
+		sockaddrs[RTA(1 << bit)] = ( pos.copy(), sa_len, present )
+		pos = pos + np.where(present, np.where(sa_len > 0, 1 + ((sa_len - 1) | 3), 4), 0)
+	dst_pos, dst_len, dst_present = sockaddrs[RTA.DST]
+	family = np.where(dst_present & (dst_len > 1), raw[np.minimum(dst_pos + 1, len(raw) - 1)], AF.UNSPEC)
+	routes['family'] = family
+	# addresses, the mask family is the destination one as netmask sockaddrs usually carry none
+	for rta, column in ( ( RTA.DST, 'dst' ), ( RTA.NETMASK, 'mask' ) ):
+		sa_pos, sa_len, present = sockaddrs[rta]
+		for af, ( start, width ) in ADDRESS_LAYOUT.items():
+			rows = present & (family == af)
+			routes[column][rows, :width] = gather(raw, sa_pos[rows], sa_len[rows], start, width)
+	gw_pos, gw_len, gw_present = sockaddrs[RTA.GATEWAY]
+	gw_family = np.where(gw_present & (gw_len > 1), raw[np.minimum(gw_pos + 1, len(raw) - 1)], AF.UNSPEC)
+	routes['gateway_family'] = gw_family
+	for af, ( start, width ) in ADDRESS_LAYOUT.items():
+		rows = gw_family == af
+		routes['gateway'][rows, :width] = gather(raw, gw_pos[rows], gw_len[rows], start, width)
+	# sockaddr_dl, the link layer address follows the interface name : sdl_data + sdl_nlen
+	rows = gw_family == AF.LINK
+	if rows.any():
+		nlen = raw[np.minimum(gw_pos[rows] + 5, len(raw) - 1)].astype(np.int64)
+		alen = np.minimum(raw[np.minimum(gw_pos[rows] + 6, len(raw) - 1)], 16)
+		lladdr = gather(raw, gw_pos[rows], gw_len[rows], SOCKADDR_DL_HEADER + nlen, 16)
+		routes['gateway'][rows] = np.where(np.arange(16) < alen[:, None], lladdr, 0)
+	# IPv6 scopes, of the destination and of the gateway
+	moveScope(raw, routes['dst'], routes['scope'], dst_pos, dst_len, dst_present & (family == AF.INET6))
+	moveScope(raw, routes['gateway'], routes['gateway_scope'], gw_pos, gw_len, gw_family == AF.INET6)
+	# prefix length, host routes without a netmask cover the whole address
+	prefix = np.unpackbits(routes['mask'], axis=1).sum(axis=1)
+	host = ~sockaddrs[RTA.NETMASK][2] & ((routes['flags'] & RTF.HOST.value) != 0)
+	prefix = np.where(host & (family == AF.INET), 32, prefix)
+	prefix = np.where(host & (family == AF.INET6), 128, prefix)
+	routes['prefix'] = prefix
+	return routes
+
+def flagMask(routes: np.ndarray, required = 0, forbidden = 0) -> np.ndarray:
+	required = int(required)
+	forbidden = int(forbidden)
+	return ((routes['flags'] & required) == required) & ((routes['flags'] & forbidden) == 0)
+
+def addressColumn(address: bytes) -> np.ndarray:
+	# a 4 or 16 bytes address, padded like the dst and gateway columns
+	return np.frombuffer(address.ljust(16, b'\0'), dtype=np.uint8)
+
+def addressMask(routes: np.ndarray, column: str, address: bytes) -> np.ndarray:
+	return (routes[column] == addressColumn(address)).all(axis=1)
+
+def saveColumns(routes: np.ndarray, path: str) -> None:
+	np.save(path, routes, allow_pickle=False)
+
+def loadColumns(path: str, mmap: bool = True) -> np.ndarray:
+	return np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+
+def main(argv):
+	if len(argv) != 3:
+		sys.exit('usage: {0} rtDumpFile output.npy'.format(argv[0]))
+	routes = routeColumns(readRouteDump(argv[1]))
+	saveColumns(routes, argv[2])
+	print(f'{len(routes)} routes, {int(flagMask(routes, RTF.GATEWAY, RTF.GLOBAL).sum())} GATEWAY and not GLOBAL')
+
+if __name__ == '__main__':
+    main(sys.argv)
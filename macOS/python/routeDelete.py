@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Pipelined route deletion over an AF_ROUTE socket.
+
+Deleting a route is done by writing its rt_msghdr back to the routing socket with rtm_type set to RTM_DELETE.
+With SO_USELOOPBACK set, the kernel echoes every message it processed back to the sender, with rtm_errno filled in.
+
+Instead of one blocking write per route with the echo ignored, routeBatchDelete
+
+- builds every RTM_DELETE message upfront, each with its own rtm_seq and our rtm_pid
+- writes them back to back, keeping at most `window` messages waiting for their echo
+- matches echoes to requests by ( rtm_pid, rtm_seq ), anything else read from the socket (other processes, interface events ...) is ignored
+- reports a per-route result, rtm_errno 0 meaning the route was deleted
+
+The socket only needs send, recv and fileno, so a socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) end can stand in for the routing socket.
+"""
+import errno, os, select, socket, time
+from typing import Iterable, NamedTuple
+from routeDump import RTM, RT_MSGHDR, routeRecord, iterRouteDump
+
+# large enough for an rt_msghdr followed by RTAX_MAX sockaddr_in6 or sockaddr_dl
+RT_MSG_MAXLEN = 2048
+
+class routeDeleteRequest(NamedTuple):
+	seq: int
+	route: routeRecord
+	message: bytes
+
+class routeDeleteResult(NamedTuple):
+	seq: int
+	route: routeRecord
+	# None when the route was not acknowledged before the timeout, or in dry-run mode
+	ok: bool
+	errno: int
+
+def deleteMessage(rt_route: routeRecord, seq: int, pid: int) -> bytes:
+	# the dumped message is sent back as is, only rtm_type, rtm_pid and rtm_seq are patched in the copy
+	rtmsg = bytearray(rt_route.message)
+	RT_MSGHDR.pack_into(rtmsg, 0, rt_route.msglen, rt_route.version, RTM.DELETE, rt_route.index, rt_route.flags, \
+						rt_route.addrs, pid, seq, 0, rt_route.use, rt_route.inits)
+	return bytes(rtmsg)
+
+class routeBatchDelete:
+	def __init__(self, rt_sock: socket.socket, window: int = 64, timeout: float = 1.0, seq: int = 1, pid: int = None):
+		self.rt_sock = rt_sock
+		self.window = max(1, window)
+		self.timeout = timeout
+		self.seq = seq
+		self.pid = os.getpid() if pid is None else pid
+	def plan(self, routes: Iterable[routeRecord]) -> list:
+		requests = []
+		for rt_route in routes:
+			requests.append(routeDeleteRequest(self.seq, rt_route, deleteMessage(rt_route, self.seq, self.pid)))
+			self.seq += 1
+		return requests
+	def run(self, routes: Iterable[routeRecord], dry_run: bool = False) -> list:
+		requests = self.plan(routes)
+		if dry_run:
+			return [routeDeleteResult(r.seq, r.route, None, None) for r in requests]
+		results = {}
+		inflight = {}
+		pending = iter(requests)
+		exhausted = False
+		while not exhausted or inflight:
+			# filling the in-flight window, writes are back to back with no wait on the kernel in between
+			while not exhausted and len(inflight) < self.window:
+				request = next(pending, None)
+				if request is None:
+					exhausted = True
+					break
+				try:
+					self.rt_sock.send(request.message)
+				except OSError as e:
+					# the routing socket reports most failures (ESRCH, EEXIST ...) synchronously on write
+					results[request.seq] = routeDeleteResult(request.seq, request.route, False, e.errno)
+					continue
+				inflight[request.seq] = request
+			if inflight and not self.readReplies(inflight, results):
+				# nothing came back in time, giving up on what's in flight but keeping on with the rest of the batch
+				for request in inflight.values():
+					results[request.seq] = routeDeleteResult(request.seq, request.route, None, errno.ETIMEDOUT)
+				inflight.clear()
+		return [results[r.seq] for r in requests]
+	def readReplies(self, inflight: dict, results: dict) -> bool:
+		# blocks until at least one reply is matched or the timeout expires, then drains whatever is already queued,
+		# the timeout is an overall deadline, unrelated messages do not push it back
+		deadline = time.monotonic() + self.timeout
+		matched = False
+		while inflight:
+			readable, _, _ = select.select([self.rt_sock], [], [], 0 if matched else max(0, deadline - time.monotonic()))
+			if not readable:
+				break
+			reply = self.rt_sock.recv(RT_MSG_MAXLEN)
+			for rt_reply in iterRouteDump(reply):
+				if rt_reply.type != RTM.DELETE or rt_reply.pid != self.pid or rt_reply.seq not in inflight:
+					continue
+				request = inflight.pop(rt_reply.seq)
+				results[request.seq] = routeDeleteResult(request.seq, request.route, rt_reply.errno == 0, rt_reply.errno)
+				matched = True
+			if time.monotonic() >= deadline:
+				break
+		return matched
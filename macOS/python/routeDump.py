@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Zero-copy parser for the routing messages returned by the NET_RT_DUMP sysctl (and read from an AF_ROUTE socket).
+
+A NET_RT_DUMP blob is a suite of messages laid out back to back, each of them being
+
+- a struct rt_msghdr, its rtm_msglen member giving the length of the full message
+- as many sockaddr structs as there are bits set in rtm_addrs (RTA_DST, RTA_GATEWAY, RTA_NETMASK ...), in bit order
+  each sockaddr is padded to a multiple of sizeof(int), a sa_len of 0 still takes sizeof(int) bytes
+
+The whole blob is walked through a single memoryview, headers are unpacked in place with struct.unpack_from and
+every sockaddr is handed out as a memoryview slice of the blob, so nothing is copied while walking the dump.
+
+This module only depends on the standard library, a blob captured on macOS can be parsed on any platform :
+	python3 routeDump.py rt_dump.bin
+
+routeDumpFixtures holds blobs laid out like the macOS ones, a NET_RT_DUMP with RTA gaps, compressed netmasks, IPv6 routes
+with embedded and sin6_scope_id scopes, interface and address messages and an rt_msghdr of another version mixed in, and
+routing socket messages ending with a truncated one, with the records expected for each in expected.json. --check parses
+them, and every truncation of them, which must give the records which fit in it.
+	python3 routeDump.py --check [fixturesDirectory]
+"""
+import ctypes, enum, json, os, struct, sys
+from typing import Iterator, NamedTuple
+
+RTM_VERSION = 5
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routeDumpFixtures')
+
+class RTF(enum.Enum):
+	UP = 0x1, "U"
+	GATEWAY = 0x2, "G"
+	HOST = 0x4, "H"
+	REJECT = 0x8, "R"
+	DYNAMIC = 0x10, "D"
+	MODIFIED = 0x20, "M"
+	DONE = 0x40, "d"
+	DELCLONE = 0x80, ""
+	CLONING = 0x100, "C"
+	XRESOLVE = 0x200, "X"
+	LLINFO = 0x400, "L"
+	STATIC = 0x800, "S"
+	BLACKHOLE = 0x1000, "B"
+	NOIFREF = 0x2000, ""
+	PROTO2 = 0x4000, "1"
+	PROTO1 = 0x8000, "2"
+	PRCLONING = 0x10000, "c"
+	WASCLONED = 0x20000, "W"
+	PROTO3 = 0x40000, "3"
+	PINNED = 0x100000, ""
+	LOCAL = 0x200000, ""
+	BROADCAST = 0x400000, "b"
+	MULTICAST = 0x800000, "m"
+	IFSCOPE = 0x1000000, "I"
+	CONDEMNED = 0x2000000, ""
+	IFREF = 0x4000000, "i"
+	PROXY = 0x8000000, "Y"
+	ROUTER = 0x10000000, "r"
+	DEAD = 0x20000000, ""
+	GLOBAL = 0x40000000, "g"
+	def __eq__(self, other) -> bool:
+		if self.__class__ is other.__class__:
+			return self.value == other.value
+		return NotImplemented
+	def __rand__(self, other) -> bool:
+		if self.__class__ is other.__class__:
+			return self.value & other.value
+		if other.__class__ == int:
+			return self.value & other
+		return NotImplemented
+	def __or__(self, other) -> bool:
+		if self.__class__ is other.__class__:
+			return self.value | other.value
+		if other.__class__ == int:
+			return self.value | other
+		return NotImplemented
+	def __add__(self, other) -> bool:
+		if self.__class__ is other.__class__:
+			return self.value + other.value
+		if other.__class__ == int:
+			return self.value + other
+		return NotImplemented
+	def __new__(cls, value, flag) -> object:
+		member = object.__new__(cls)
+		member._value_ = value
+		member.flag = flag
+		return member
+	def __int__(self) -> int:
+		return self.value
+
+def RTF_LIST(mask: ctypes.c_int, flags: enum.Enum = RTF) -> list:
+    return [flag for flag in flags if mask & flag.value]
+
+def RTF_LIST_STR(flags: list) -> str:
+	s = str()
+	for f in flags:
+		s = f"{s}{f.flag}"
+	return s
+
+class RTM(enum.IntEnum):
+	ADD = 0x1
+	DELETE = 0x2
+	CHANGE = 0x3
+	GET = 0x4
+	LOSING = 0x5
+	REDIRECT = 0x6
+	MISS = 0x7
+	LOCK = 0x8
+	OLDADD = 0x9
+	OLDDEL = 0xa
+	RESOLVE = 0xb
+	NEWADDR = 0xc
+	DELADDR = 0xd
+	IFINFO = 0x10
+	NEWMADDR = 0xf
+	DELMADDR = 0xa
+	IFINFO2 = 0x12
+	NEWMADDR2 = 0x13
+	GET2 = 0x14
+
+class AF(enum.IntEnum):
+	UNSPEC = 0
+	UNKNWN = 255
+	INET = 2
+	APPLETALK = 16
+	LINK = 18
+	INET6 = 30
+
+class RTA(enum.IntEnum):
+	DST = 0x1
+	GATEWAY = 0x2
+	NETMASK = 0x4
+	GENMASK = 0x8
+	IFP = 0x10
+	IFA = 0x20
+	AUTHOR = 0x40
+	BRD = 0x80
+
+class in_addr(ctypes.BigEndianStructure):
+	_fields_ = [("s_addr", ctypes.c_uint32)]
+
+class sockaddr_in(ctypes.Structure):
+	_fields_ = [("sin_len", ctypes.c_uint8),
+				("sin_family", ctypes.c_uint8),
+				("sin_port", ctypes.c_uint16),
+				("sin_addr", in_addr),
+				("sin_zero", ctypes.c_char * 8)]
+
+class in6_addr(ctypes.BigEndianStructure):
+	_fields_ = [("s6_addr", ctypes.c_ubyte * 16)]
+
+class sockaddr_in6(ctypes.Structure):
+	_fields_ = [("sin6_len", ctypes.c_uint8),
+				("sin6_family", ctypes.c_uint8),
+				("sin6_port", ctypes.c_uint16),
+				("sin6_flowinfo", ctypes.c_uint32),
+				("sin6_addr", in6_addr),
+				("sin6_scope_id", ctypes.c_uint32)]
+
+class socketaddr(ctypes.Structure):
+	_fields_ = [("sa_len", ctypes.c_uint8),
+			("sa_family", ctypes.c_uint8),
+			("sa_data", ctypes.c_char * 14)] #sa_data can be longer, but we're re-casting into another struct later ...
+
+class rt_metrics(ctypes.Structure):
+	_fields_ = [("rmx_locks", ctypes.c_uint32),
+				("rmx_mtu", ctypes.c_uint32),
+				("rmx_hopcount", ctypes.c_uint32),
+				("rmx_expire", ctypes.c_int32),
+				("rmx_recvpipe", ctypes.c_uint32),
+				("rmx_sendpipe", ctypes.c_uint32),
+				("rmx_ssthresh", ctypes.c_uint32),
+				("rmx_rtt", ctypes.c_uint32),
+				("rmx_rttvar", ctypes.c_uint32),
+				("rmx_pksent", ctypes.c_uint32),
+				("rmx_state", ctypes.c_uint32),
+				("rmx_filler", ctypes.c_uint32 * 3)]
+
+class rt_msg(ctypes.Structure):
+    _fields_ = [("rtm_msglen", ctypes.c_ushort),
+                ("rtm_version", ctypes.c_ubyte),
+                ("rtm_type", ctypes.c_ubyte),
+                ("rtm_index", ctypes.c_ushort),
+                ("rtm_flags", ctypes.c_int),
+                ("rtm_addrs", ctypes.c_int),
+                ("rtm_pid", ctypes.c_uint32),
+                ("rtm_seq", ctypes.c_int),
+                ("rtm_errno", ctypes.c_int),
+                ("rtm_use", ctypes.c_int),
+                ("rtm_inits", ctypes.c_uint32),
+                ("rtm_rmx", rt_metrics)]
+
+# rt_msghdr members up to rtm_rmx, unpacked straight out of the blob with the same native alignment ctypes uses above
+RT_MSGHDR = struct.Struct('@HBBHiiIiiiI')
+RT_MSGLEN = struct.Struct('@H')
+RT_MSGHDR_SIZE = ctypes.sizeof(rt_msg)
+RTM_RMX_OFFSET = rt_msg.rtm_rmx.offset
+# only these message types start with a struct rt_msghdr, interface and address messages have their own headers
+RT_MSGHDR_TYPES = frozenset(range(RTM.ADD, RTM.RESOLVE + 1))
+# RTAX_MAX, the number of RTA_* bits a message may carry
+RTAX_MAX = 8
+
+def ROUNDUP(addr: ctypes.c_ubyte, int_sz: int = ctypes.sizeof(ctypes.c_int())) -> int:
+	if addr > 0:
+		return 1 + ((addr - 1) | (int_sz - 1))
+	else:
+		return int_sz
+
+class routeRecord(NamedTuple):
+	offset: int
+	msglen: int
+	version: int
+	type: int
+	index: int
+	flags: int
+	addrs: int
+	pid: int
+	seq: int
+	errno: int
+	use: int
+	inits: int
+	# RTA flag -> memoryview of exactly sa_len bytes of the sockaddr
+	sockaddrs: dict
+	buf: memoryview
+	@property
+	def message(self) -> memoryview:
+		return self.buf[self.offset:self.offset + self.msglen]
+	@property
+	def metrics(self) -> rt_metrics:
+		return rt_metrics.from_buffer_copy(self.buf, self.offset + RTM_RMX_OFFSET)
+
+def byteView(buf, size: int = None) -> memoryview:
+	# bytes, bytearray, mmap or ctypes buffers all end up as a flat unsigned byte view, no copy involved
+	view = memoryview(buf)
+	if view.format != 'B' or view.ndim != 1:
+		view = view.cast('B')
+	if size is not None:
+		view = view[:size]
+	return view
+
+def parseSockaddrs(view: memoryview, sa_idx: int, msg_end: int, addrs: int) -> dict:
+	sockaddrs = {}
+	rta = 1
+	while rta <= addrs and rta < (1 << RTAX_MAX) and sa_idx < msg_end:
+		if rta & addrs:
+			sa_len = view[sa_idx]
+			sockaddrs[RTA(rta)] = view[sa_idx:sa_idx + sa_len]
+			sa_idx += ROUNDUP(sa_len)
+		rta <<= 1
+	return sockaddrs
+
+def iterRouteDump(buf, size: int = None) -> Iterator[routeRecord]:
+	view = byteView(buf, size)
+	end = len(view)
+	idx = 0
+	unpack = RT_MSGHDR.unpack_from
+	unpack_msglen = RT_MSGLEN.unpack_from
+	while idx + 4 <= end:
+		# rtm_msglen, rtm_version and rtm_type are common to every routing message header
+		msglen, = unpack_msglen(view, idx)
+		if msglen == 0 or idx + msglen > end:
+			break
+		msg_idx = idx
+		idx += msglen
+		if view[msg_idx + 3] not in RT_MSGHDR_TYPES or view[msg_idx + 2] != RTM_VERSION or msglen < RT_MSGHDR_SIZE:
+			continue
+		_, version, rtm_type, index, flags, addrs, pid, seq, errno, use, inits = unpack(view, msg_idx)
+		sockaddrs = parseSockaddrs(view, msg_idx + RT_MSGHDR_SIZE, idx, addrs)
+		yield routeRecord(msg_idx, msglen, version, rtm_type, index, flags, addrs, pid, seq, errno, use, inits, sockaddrs, view)
+
+def sockaddrStruct(sa: memoryview, s: type) -> ctypes.Structure:
+	# a single copy of at most sizeof(s) bytes, short sockaddrs (compressed netmasks) are zero padded
+	blob = bytearray(ctypes.sizeof(s))
+	n = min(len(sa), len(blob))
+	blob[:n] = sa[:n]
+	return s.from_buffer(blob)
+
+def readRouteDump(path: str) -> bytes:
+	with open(path, 'rb') as f:
+		return f.read()
+
+def recordFields(rt_route: routeRecord) -> dict:
+	# the decoded header members and sockaddrs, as expected.json has them
+	return { 'offset': rt_route.offset, 'msglen': rt_route.msglen, 'version': rt_route.version, 'type': RTM(rt_route.type).name,
+		'index': rt_route.index, 'flags': rt_route.flags, 'addrs': rt_route.addrs, 'pid': rt_route.pid, 'seq': rt_route.seq,
+		'errno': rt_route.errno, 'sockaddrs': { rta.name: bytes(sa).hex() for rta, sa in rt_route.sockaddrs.items() } }
+
+def checkFixtures(directory: str = FIXTURES_DIR) -> int:
+	# number of fixtures checked, AssertionError on the first parse which differs from expected.json
+	with open(os.path.join(directory, 'expected.json'), 'r', encoding='utf-8') as f:
+		expected = json.load(f)
+	for name, records in expected.items():
+		blob = readRouteDump(os.path.join(directory, name))
+		parsed = [recordFields(rt_route) for rt_route in iterRouteDump(blob)]
+		assert parsed == records, f'{name} parsed as {parsed!r}, expected {records!r}'
+		for size in range(len(blob)):
+			truncated = [recordFields(rt_route) for rt_route in iterRouteDump(blob, size)]
+			fitting = [record for record in records if record['offset'] + record['msglen'] <= size]
+			assert truncated == fitting, f'{name} cut at {size} bytes parsed as {truncated!r}'
+	return len(expected)
+
+def main(argv):
+	if len(argv) in ( 2, 3 ) and argv[1] == '--check':
+		print(f'{checkFixtures(*argv[2:])} routing message fixtures: ok')
+		return
+	if len(argv) != 2:
+		sys.exit('usage: {0} rtDumpFile | --check [fixturesDirectory]'.format(argv[0]))
+	for rt_route in iterRouteDump(readRouteDump(argv[1])):
+		sockaddrs = ' '.join(f'{rta.name}={bytes(sa).hex()}' for rta, sa in rt_route.sockaddrs.items())
+		print(f'{rt_route.offset:#x} {RTM(rt_route.type).name} index {rt_route.index} flags {RTF_LIST_STR(RTF_LIST(rt_route.flags))} {sockaddrs}')
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Table driven decoding of the routing message bit masks (RTF_* route flags, RTA_* address bits) and message types (RTM_*).
+
+Instead of walking the whole enum for every route, each mask is split in bytes and every byte is looked up in a
+256 entries table built once per enum, the tables hold the members and tokens for every possible byte value.
+Routing tables only use a few dozen distinct flag combinations, so decoded masks are also memoized.
+
+The RTF letters (the ones netstat -rn prints) stay the vocabulary for route flags :
+	RTF_TABLE.string(0x40000803) -> 'UGSg'
+	RTF_TABLE.members(0x40000803) -> [RTF.UP, RTF.GATEWAY, RTF.STATIC, RTF.GLOBAL]
+	flagRule(RTF.GATEWAY, RTF.GLOBAL).match(0x803) -> True
+"""
+import enum
+from typing import Callable
+from routeDump import RTF, RTM, RTA
+
+MASK_BYTES = 4
+# plenty for a routing table, masks read from the wire are arbitrary so the memo is not allowed to grow forever
+MEMO_MAXSIZE = 4096
+
+class flagTable:
+	def __init__(self, flags: enum.EnumMeta, token: Callable = lambda f: f.flag, separator: str = ''):
+		self.separator = separator
+		# enums are declared in ascending bit order, byte tables are concatenated from the low byte up so the order is kept
+		self.byteMembers = [[()] * 256 for _ in range(MASK_BYTES)]
+		self.byteTokens = [[()] * 256 for _ in range(MASK_BYTES)]
+		for pos in range(MASK_BYTES):
+			shift = pos * 8
+			bits = [f for f in flags if (int(f.value) >> shift) & 0xff and int(f.value) >> shift < 256]
+			for b in range(1, 256):
+				members = tuple(f for f in bits if (int(f.value) >> shift) & b)
+				self.byteMembers[pos][b] = members
+				self.byteTokens[pos][b] = tuple(token(f) for f in members if token(f))
+		self.stringMemo = {}
+		self.membersMemo = {}
+	def string(self, mask: int) -> str:
+		mask &= 0xffffffff
+		s = self.stringMemo.get(mask)
+		if s is None:
+			tokens = []
+			for pos in range(MASK_BYTES):
+				tokens.extend(self.byteTokens[pos][(mask >> (pos * 8)) & 0xff])
+			s = self.separator.join(tokens)
+			if len(self.stringMemo) < MEMO_MAXSIZE:
+				self.stringMemo[mask] = s
+		return s
+	def members(self, mask: int) -> list:
+		mask &= 0xffffffff
+		m = self.membersMemo.get(mask)
+		if m is None:
+			m = []
+			for pos in range(MASK_BYTES):
+				m.extend(self.byteMembers[pos][(mask >> (pos * 8)) & 0xff])
+			if len(self.membersMemo) < MEMO_MAXSIZE:
+				self.membersMemo[mask] = m
+		return list(m)
+
+class valueTable:
+	# RTM_* are plain values, not bits, a direct 256 entries lookup is all it takes
+	def __init__(self, values: enum.EnumMeta):
+		self.names = [str(v) for v in range(256)]
+		# reversed so that the first declared name wins over its aliases
+		for v in reversed(list(values.__members__.values())):
+			self.names[int(v)] = v.name
+	def string(self, value: int) -> str:
+		return self.names[value & 0xff]
+
+class flagRule:
+	# a mask matches when all of the required bits are set and none of the forbidden ones
+	__slots__ = ('required', 'forbidden')
+	def __init__(self, required = 0, forbidden = 0):
+		# RTF members are turned into plain ints once, so matching never goes through the RTF dunder methods
+		self.required = int(required)
+		self.forbidden = int(forbidden)
+	def match(self, mask: int) -> bool:
+		return mask & self.required == self.required and not mask & self.forbidden
+	def __repr__(self) -> str:
+		return f'flagRule({RTF_TABLE.string(self.required)!r}, {RTF_TABLE.string(self.forbidden)!r})'
+
+RTF_TABLE = flagTable(RTF)
+RTA_TABLE = flagTable(RTA, token=lambda f: f.name, separator=',')
+RTM_TABLE = valueTable(RTM)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Event driven watch of the routing table, for catching SVPN leftover routes as soon as they show up.
+
+The table is seeded once from a NET_RT_DUMP blob, it is then kept up to date with the RTM_ADD, RTM_CHANGE and RTM_DELETE
+messages the kernel broadcasts on the AF_ROUTE socket. Only the route a message is about gets looked at, so the CPU cost
+follows the rate of routing changes and not the size of the table.
+
+Every added or changed route that is a leftover is reported once as a 'leftover' event, the caller then decides to remove it.
+Our own RTM_DELETE messages are matched back by ( rtm_pid, rtm_seq ) and reported as 'removed' or 'failed' events.
+When the same socket was used for a routeBatchDelete before, the monitor starts at the seq the batch ended with and the
+socket is drained before the seeding dump, late echoes of the batch are neither matched to our deletes nor applied over the dump.
+
+The socket only needs send, recv and fileno, recorded message streams can be replayed through a socketpair end.
+"""
+import os, select, socket
+from typing import Callable, Iterable, NamedTuple
+from routeDump import RTM, iterRouteDump
+from routeDelete import RT_MSG_MAXLEN, deleteMessage
+from routeTable import routeEntry, routeTable, entryFromRecord
+from svpnPolicy import isSvpnLeftover
+
+TABLE_UPDATES = frozenset(( RTM.ADD, RTM.CHANGE, RTM.DELETE ))
+
+class routeEvent(NamedTuple):
+	# 'leftover', 'removed' or 'failed'
+	kind: str
+	entry: routeEntry
+	errno: int = 0
+
+class routeMonitor:
+	def __init__(self, rt_sock: socket.socket, table: routeTable = None, isLeftover: Callable = isSvpnLeftover, seq: int = 1, pid: int = None):
+		self.rt_sock = rt_sock
+		self.table = routeTable() if table is None else table
+		self.isLeftover = isLeftover
+		self.seq = seq
+		self.pid = os.getpid() if pid is None else pid
+		# rtm_seq -> entry of the deletes we are waiting on, their keys are not reported again meanwhile
+		self.pending = {}
+		self.pendingKeys = set()
+		self.closed = False
+	@classmethod
+	def seed(cls, rt_sock: socket.socket, buf, size: int = None, **kwargs) -> 'routeMonitor':
+		return cls(rt_sock, routeTable.fromRouteDump(buf, size), **kwargs)
+	def leftovers(self) -> list:
+		# the seed is the only time the whole table gets walked
+		return [routeEvent('leftover', entry) for entry in self.table if self.isLeftover(entry)]
+	def handle(self, message: bytes) -> list:
+		events = []
+		for rt_route in iterRouteDump(message):
+			if rt_route.type not in TABLE_UPDATES:
+				continue
+			if rt_route.pid == self.pid and rt_route.seq in self.pending:
+				entry = self.pending.pop(rt_route.seq)
+				self.pendingKeys.discard(entry.key)
+				if rt_route.errno == 0:
+					self.table.remove(entry.key)
+					events.append(routeEvent('removed', entry))
+				else:
+					events.append(routeEvent('failed', entry, rt_route.errno))
+				continue
+			# failed requests from other processes did not change anything
+			if rt_route.errno != 0:
+				continue
+			entry = entryFromRecord(rt_route)
+			if entry is None:
+				continue
+			if rt_route.type == RTM.DELETE:
+				self.table.remove(entry.key)
+				continue
+			self.table.add(entry)
+			if entry.key not in self.pendingKeys and self.isLeftover(entry):
+				events.append(routeEvent('leftover', entry))
+		return events
+	def poll(self, timeout: float = None) -> list:
+		# blocks until something is readable, then drains the socket without blocking
+		events = []
+		readable, _, _ = select.select([self.rt_sock], [], [], timeout)
+		while readable:
+			message = self.rt_sock.recv(RT_MSG_MAXLEN)
+			if not message:
+				self.closed = True
+				break
+			events.extend(self.handle(message))
+			readable, _, _ = select.select([self.rt_sock], [], [], 0)
+		return events
+	def remove(self, entry: routeEntry) -> list:
+		# the kernel answer comes back through poll(), a synchronous write error is reported right away
+		seq = self.seq
+		self.seq += 1
+		try:
+			self.rt_sock.send(deleteMessage(entry.route, seq, self.pid))
+		except OSError as e:
+			return [routeEvent('failed', entry, e.errno)]
+		self.pending[seq] = entry
+		self.pendingKeys.add(entry.key)
+		return []
+	def run(self, callback: Callable, dry_run: bool = False, timeout: float = None) -> None:
+		# callback(event) is called for every event, leftovers are removed unless in dry-run, runs until interrupted or the socket is closed
+		events = self.leftovers()
+		while not self.closed:
+			for event in events:
+				callback(event)
+				if event.kind == 'leftover' and not dry_run:
+					for failure in self.remove(event.entry):
+						callback(failure)
+			events = self.poll(timeout)
+
+def drainSocket(rt_sock: socket.socket) -> int:
+	# drops whatever is queued on the socket without blocking, returns the number of messages dropped
+	dropped = 0
+	while select.select([rt_sock], [], [], 0)[0]:
+		if not rt_sock.recv(RT_MSG_MAXLEN):
+			break
+		dropped += 1
+	return dropped
+
+def replay(messages: Iterable[bytes], monitor: routeMonitor) -> list:
+	# feeds recorded routing socket messages straight to the monitor, no socket involved
+	events = []
+	for message in messages:
+		events.extend(monitor.handle(message))
+	return events
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Numeric formatting of the sockaddr structs found in routing messages, without calling libc getnameinfo through ctypes.
+
+Strings are built straight from the raw sockaddr bytes and match what getnameinfo(NI_NUMERICHOST | NI_WITHSCOPEID) gives on macOS
+
+- AF_INET  : dotted quad
+- AF_INET6 : inet_ntop form, link-local addresses get their scope appended as %ifname (or %index when the interface is gone),
+             the names are the live interfaces unless a lookup is given (the interfaces recorded in a capture)
+             the kernel embeds the scope of link-local addresses in the second 16 bits word of the address (KAME style),
+             it is moved back to the scope id the same way getnameinfo does
+- AF_LINK  : link#index when there is no link layer address, aa:bb:cc:dd:ee:ff otherwise (like netstat -rn)
+
+Routing tables repeat the same few gateways and netmasks thousands of times, so every result with the live interface
+names is cached by its raw bytes.
+"""
+import socket, struct
+from functools import lru_cache
+from typing import Callable
+from routeDump import AF
+
+SOCKADDR_CACHE_SIZE = 4096
+SIN_ADDR_OFFSET = 4
+SIN6_ADDR_OFFSET = 8
+SIN6_SCOPE_ID = struct.Struct('@I')
+SIN6_SCOPE_ID_OFFSET = 24
+# sdl_len, sdl_family, sdl_index, sdl_type, sdl_nlen, sdl_alen, sdl_slen then sdl_data
+SOCKADDR_DL = struct.Struct('@BBHBBBB')
+
+@lru_cache(maxsize=256)
+def interfaceName(index: int) -> str:
+	try:
+		return socket.if_indextoname(index)
+	except OSError:
+		return ''
+
+def padded(sa: bytes, size: int) -> bytes:
+	# sa_len may be shorter than the struct, the missing bytes are zeroes
+	return sa[:size].ljust(size, b'\0')
+
+def formatInet(sa: bytes) -> str:
+	return socket.inet_ntop(socket.AF_INET, padded(sa, SIN_ADDR_OFFSET + 4)[SIN_ADDR_OFFSET:])
+
+def inet6AddressScope(sa: bytes) -> tuple[bytes, int]:
+	sa = padded(sa, SIN6_SCOPE_ID_OFFSET + 4)
+	addr = bytearray(sa[SIN6_ADDR_OFFSET:SIN6_ADDR_OFFSET + 16])
+	scope_id, = SIN6_SCOPE_ID.unpack_from(sa, SIN6_SCOPE_ID_OFFSET)
+	# fe80::/10 link-local, ff01::/16 interface-local and ff02::/16 link-local multicast scopes
+	if (addr[0] == 0xfe and addr[1] & 0xc0 == 0x80) or (addr[0] == 0xff and addr[1] & 0x0f in ( 0x01, 0x02 )):
+		embedded = addr[2] << 8 | addr[3]
+		if embedded:
+			scope_id = embedded
+			addr[2:4] = b'\0\0'
+	return ( bytes(addr), scope_id )
+
+def formatInet6(sa: bytes, names: Callable[[int], str] = interfaceName) -> str:
+	addr, scope_id = inet6AddressScope(sa)
+	host = socket.inet_ntop(socket.AF_INET6, addr)
+	if scope_id:
+		host = f'{host}%{names(scope_id) or scope_id}'
+	return host
+
+def formatLink(sa: bytes) -> str:
+	sa = padded(sa, max(len(sa), SOCKADDR_DL.size))
+	_, _, index, _, nlen, alen, slen = SOCKADDR_DL.unpack_from(sa)
+	if nlen == 0 and alen == 0 and slen == 0:
+		return f'link#{index}'
+	lladdr = sa[SOCKADDR_DL.size + nlen:SOCKADDR_DL.size + nlen + alen]
+	return ':'.join(f'{c:02x}' for c in lladdr)
+
+FORMATTERS = {
+	AF.INET: formatInet,
+	AF.INET6: formatInet6,
+	AF.LINK: formatLink
+}
+
+@lru_cache(maxsize=SOCKADDR_CACHE_SIZE)
+def formatSockaddrBytes(sa: bytes) -> str:
+	if len(sa) < 2 or sa[1] not in FORMATTERS:
+		return ''
+	return FORMATTERS[sa[1]](sa)
+
+def formatSockaddr(sa: memoryview, names: Callable[[int], str] = None) -> str:
+	# the memoryview slice is turned into a short bytes key, it does not keep the whole dump alive in the cache
+	if names is None:
+		return formatSockaddrBytes(bytes(sa))
+	# names of another machine, not cached
+	sa = bytes(sa)
+	if len(sa) < 2 or sa[1] not in FORMATTERS:
+		return ''
+	return formatInet6(sa, names) if sa[1] == AF.INET6 else FORMATTERS[sa[1]](sa)
+
+def addressBytes(sa: memoryview) -> tuple[int, bytes]:
+	# the bare address of an AF_INET or AF_INET6 sockaddr, with any embedded link-local scope cleared
+	sa = bytes(sa)
+	family = sa[1] if len(sa) > 1 else AF.UNSPEC
+	if family == AF.INET:
+		return ( family, padded(sa, SIN_ADDR_OFFSET + 4)[SIN_ADDR_OFFSET:] )
+	if family == AF.INET6:
+		return ( family, inet6AddressScope(sa)[0] )
+	return ( family, b'' )
+
+@lru_cache(maxsize=SOCKADDR_CACHE_SIZE)
+def prefixFromMaskBytes(mask: bytes, family: int) -> int:
+	# netmask sockaddrs usually carry no family, the destination family tells where the address bytes start
+	if family == AF.INET:
+		addr = mask[SIN_ADDR_OFFSET:SIN_ADDR_OFFSET + 4]
+	elif family == AF.INET6:
+		addr = mask[SIN6_ADDR_OFFSET:SIN6_ADDR_OFFSET + 16]
+	else:
+		return 0
+	# int.bit_count is python 3.10, the stock macOS python3 is 3.9
+	return bin(int.from_bytes(addr, 'big')).count('1')
+
+def prefixFromMask(mask: memoryview, family: int) -> int:
+	return prefixFromMaskBytes(bytes(mask), family)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+In-memory routing table built from a NET_RT_DUMP parse, indexed for the questions the SVPN cleanup keeps asking
+
+- which route wins for this destination : longest prefix match over a binary radix trie per address family,
+  the walk is bounded by the address length (32 or 128 bits) whatever the size of the table
+- all the routes via an interface (index or name, like utun3)
+- all the routes via a gateway
+
+Routes are keyed like the kernel does, by destination, prefix length and interface scope (RTF_IFSCOPE routes),
+so the table can also be kept up to date with RTM_ADD / RTM_DELETE / RTM_CHANGE messages.
+
+	python3 routeTable.py rt_dump.bin 1.1.1.1 utun3
+"""
+import socket, sys
+from typing import Callable, Iterator, NamedTuple, Optional
+from routeDump import RTF, AF, RTA, routeRecord, iterRouteDump, readRouteDump
+from routeFlags import RTF_TABLE, flagRule
+from routeSockaddr import formatSockaddr, prefixFromMask, addressBytes, interfaceName
+
+ADDRESS_BITS = { AF.INET: 32, AF.INET6: 128 }
+HOST_RULE = flagRule(RTF.HOST)
+LLINFO_RULE = flagRule(RTF.LLINFO)
+IFSCOPE_RULE = flagRule(RTF.IFSCOPE)
+
+class routeEntry(NamedTuple):
+	family: int
+	# destination address bytes, in network order
+	dst: bytes
+	prefix: int
+	destination: str
+	gateway: str
+	index: int
+	flags: int
+	route: routeRecord
+	@property
+	def key(self) -> tuple:
+		# the same destination may be installed once unscoped and once per interface scope
+		return ( self.family, self.dst, self.prefix, self.index if IFSCOPE_RULE.match(self.flags) else 0 )
+	@property
+	def network(self) -> str:
+		if LLINFO_RULE.match(self.flags):
+			return self.destination
+		# a route with no netmask has prefix 0 too, only the all zeroes destination is the default route
+		if self.prefix == 0:
+			return self.destination if any(self.dst) else 'default'
+		return f'{self.destination}/{self.prefix}'
+	@property
+	def iface(self) -> str:
+		return interfaceName(self.index)
+	def describe(self, names: Callable[[int], str] = None) -> str:
+		# names maps an interface index to its name, the live interfaces when None, a capture replay gives the recorded ones
+		if names is None:
+			return f'{self.network} via {self.gateway} flags {RTF_TABLE.string(self.flags)} iface {self.iface} '
+		sa_gw = self.route.sockaddrs.get(RTA.GATEWAY)
+		entry = self._replace(destination=formatSockaddr(self.route.sockaddrs[RTA.DST], names),
+			gateway=formatSockaddr(sa_gw, names) if sa_gw is not None else '')
+		return f'{entry.network} via {entry.gateway} flags {RTF_TABLE.string(self.flags)} iface {names(self.index)} '
+
+def entryFromRecord(rt_route: routeRecord) -> Optional[routeEntry]:
+	sa_dst = rt_route.sockaddrs.get(RTA.DST)
+	if sa_dst is None:
+		return None
+	family, dst = addressBytes(sa_dst)
+	if family not in ADDRESS_BITS:
+		return None
+	sa_mask = rt_route.sockaddrs.get(RTA.NETMASK)
+	if sa_mask is not None:
+		prefix = prefixFromMask(sa_mask, family)
+	elif HOST_RULE.match(rt_route.flags):
+		# host routes carry no netmask, they cover the whole address
+		prefix = ADDRESS_BITS[family]
+	else:
+		prefix = 0
+	sa_gw = rt_route.sockaddrs.get(RTA.GATEWAY)
+	gateway = formatSockaddr(sa_gw) if sa_gw is not None else ''
+	return routeEntry(family, dst, prefix, formatSockaddr(sa_dst), gateway, rt_route.index, rt_route.flags, rt_route)
+
+def parseAddress(address: str) -> tuple[int, bytes]:
+	# numeric addresses only, a %scope suffix is ignored
+	address = address.split('%', 1)[0]
+	if ':' in address:
+		return ( AF.INET6, socket.inet_pton(socket.AF_INET6, address) )
+	return ( AF.INET, socket.inet_pton(socket.AF_INET, address) )
+
+class routeTable:
+	def __init__(self):
+		# trie nodes are [ child for bit 0, child for bit 1, { key: routeEntry } ]
+		self.roots = { family: [None, None, {}] for family in ADDRESS_BITS }
+		self.entries = {}
+		self.byIndex = {}
+		self.byGateway = {}
+	@classmethod
+	def fromRouteDump(cls, buf, size: int = None) -> 'routeTable':
+		table = cls()
+		for rt_route in iterRouteDump(buf, size):
+			entry = entryFromRecord(rt_route)
+			if entry is not None:
+				table.add(entry)
+		return table
+	def __len__(self) -> int:
+		return len(self.entries)
+	def __iter__(self) -> Iterator[routeEntry]:
+		return iter(list(self.entries.values()))
+	def __contains__(self, key: tuple) -> bool:
+		return key in self.entries
+	def get(self, key: tuple) -> Optional[routeEntry]:
+		return self.entries.get(key)
+	def node(self, family: int, dst: bytes, prefix: int, create: bool = False) -> Optional[list]:
+		node = self.roots[family]
+		for bit in range(prefix):
+			b = (dst[bit >> 3] >> (7 - (bit & 7))) & 1
+			if node[b] is None:
+				if not create:
+					return None
+				node[b] = [None, None, {}]
+			node = node[b]
+		return node
+	def add(self, entry: routeEntry) -> Optional[routeEntry]:
+		# adding an existing key replaces it (RTM_CHANGE), the replaced entry is handed back
+		replaced = self.remove(entry.key)
+		self.node(entry.family, entry.dst, entry.prefix, create=True)[2][entry.key] = entry
+		self.entries[entry.key] = entry
+		self.byIndex.setdefault(entry.index, {})[entry.key] = entry
+		if entry.gateway:
+			self.byGateway.setdefault(entry.gateway, {})[entry.key] = entry
+		return replaced
+	def remove(self, key: tuple) -> Optional[routeEntry]:
+		entry = self.entries.pop(key, None)
+		if entry is None:
+			return None
+		# emptied trie nodes are kept, routes tend to come back on the same prefixes
+		del self.node(entry.family, entry.dst, entry.prefix)[2][key]
+		for index, value in ( ( self.byIndex, entry.index ), ( self.byGateway, entry.gateway ) ):
+			bucket = index.get(value)
+			if bucket is not None:
+				bucket.pop(key, None)
+				if not bucket:
+					del index[value]
+		return entry
+	def lookup(self, address: str, ifscope: int = None) -> Optional[routeEntry]:
+		# longest prefix match, scoped routes only answer for their own interface like in the kernel
+		family, dst = parseAddress(address)
+		node = self.roots[family]
+		best = None
+		bit = 0
+		while node is not None:
+			for entry in node[2].values():
+				if (entry.index == ifscope) if ifscope is not None else not IFSCOPE_RULE.match(entry.flags):
+					best = entry
+					break
+			if bit == ADDRESS_BITS[family]:
+				break
+			node = node[(dst[bit >> 3] >> (7 - (bit & 7))) & 1]
+			bit += 1
+		return best
+	def routesVia(self, iface) -> list:
+		# interface index or name
+		if isinstance(iface, str):
+			try:
+				iface = socket.if_nametoindex(iface)
+			except OSError:
+				return []
+		return list(self.byIndex.get(iface, {}).values())
+	def routesThrough(self, gateway: str) -> list:
+		return list(self.byGateway.get(gateway, {}).values())
+
+def main(argv):
+	if len(argv) < 3:
+		sys.exit('usage: {0} rtDumpFile address|interface ...'.format(argv[0]))
+	table = routeTable.fromRouteDump(readRouteDump(argv[1]))
+	for query in argv[2:]:
+		try:
+			entry = table.lookup(query)
+			print(f'{query} : {entry.describe() if entry else "no route"}')
+		except OSError:
+			for entry in table.routesVia(query) or table.routesThrough(query):
+				print(f'{query} : {entry.describe()}')
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+SystemConfiguration dynamic store access for the F5 SVPN cleanup, one configd round-trip for everything it needs.
+
+Reading every value with SCDynamicStoreCopyValue costs one configd round-trip per key, 2N+3 of them for N interfaces.
+Here a single SCDynamicStoreCopyMultiple call fetches the F5 service states, the interface list and every interface
+Link and IPv4 state through a key list and a pattern list, scSnapshot then answers everything from that result.
+
+The store sits behind a small backend interface
+- dynamicStoreBackend, the live SCDynamicStore, it requires the pyobjc-framework-SystemConfiguration module
+- memoryStoreBackend, an in-memory dictionary, for unit tests, benchmarks and capture replays on any platform
+"""
+import abc, re
+from typing import Iterable
+
+F5APP_IPV4_CONFSTR = 'State:/Network/Service/F5NetworksServicePPP/IPv4'
+F5APP_DNS_CONFSTR = 'State:/Network/Service/F5NetworksServicePPP/DNS'
+IFACE_SCCONFIG_PATH = 'State:/Network/Interface'
+
+SNAPSHOT_KEYS = [F5APP_IPV4_CONFSTR, F5APP_DNS_CONFSTR, IFACE_SCCONFIG_PATH]
+# anchored, configd matches patterns anywhere in the key
+SNAPSHOT_PATTERNS = [f'^{IFACE_SCCONFIG_PATH}/[^/]+/(Link|IPv4)$']
+
+class scStoreBackend(abc.ABC):
+	@abc.abstractmethod
+	def copyMultiple(self, keys: Iterable[str], patterns: Iterable[str]) -> dict:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def removeValue(self, key: str) -> bool:
+		raise NotImplementedError
+
+class dynamicStoreBackend(scStoreBackend):
+	def __init__(self, name: str = "systemConfigurationSearch"):
+		# imported here so the rest of this module works without PyObjC
+		from SystemConfiguration import SCDynamicStoreCreate, kCFAllocatorDefault
+		self.ds = SCDynamicStoreCreate(kCFAllocatorDefault, name, None, None)
+	def copyMultiple(self, keys: Iterable[str], patterns: Iterable[str]) -> dict:
+		from SystemConfiguration import SCDynamicStoreCopyMultiple
+		values = SCDynamicStoreCopyMultiple(self.ds, list(keys), list(patterns))
+		return dict(values) if values else {}
+	def removeValue(self, key: str) -> bool:
+		from SystemConfiguration import SCDynamicStoreRemoveValue
+		return bool(SCDynamicStoreRemoveValue(self.ds, key))
+
+class memoryStoreBackend(scStoreBackend):
+	def __init__(self, values: dict = None):
+		self.values = dict(values or {})
+		# round-trips to the fake configd, for benchmarks and tests
+		self.calls = 0
+	def copyMultiple(self, keys: Iterable[str], patterns: Iterable[str]) -> dict:
+		self.calls += 1
+		found = { key: self.values[key] for key in keys if self.values.get(key) is not None }
+		for pattern in map(re.compile, patterns):
+			found.update({ key: value for key, value in self.values.items() if value is not None and pattern.search(key) })
+		return found
+	def removeValue(self, key: str) -> bool:
+		self.calls += 1
+		return self.values.pop(key, None) is not None
+
+class scSnapshot:
+	def __init__(self, values: dict):
+		self.values = values
+	@classmethod
+	def fetch(cls, backend: scStoreBackend, keys: Iterable[str] = SNAPSHOT_KEYS, patterns: Iterable[str] = SNAPSHOT_PATTERNS) -> 'scSnapshot':
+		return cls(backend.copyMultiple(keys, patterns))
+	def copyValue(self, key: str):
+		return self.values.get(key)
+	def interfaces(self) -> dict:
+		# interface name -> { 'Link': ..., 'IPv4': ... }, in the order the Interfaces key lists them
+		listed = self.copyValue(IFACE_SCCONFIG_PATH)
+		view = { name: {} for name in ( listed['Interfaces'] if listed else [] ) }
+		prefix = f'{IFACE_SCCONFIG_PATH}/'
+		for key, value in self.values.items():
+			if not key.startswith(prefix):
+				continue
+			parts = key[len(prefix):].split('/')
+			if len(parts) == 2 and parts[0] in view:
+				view[parts[0]][parts[1]] = value
+		return view
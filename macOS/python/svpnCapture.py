@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Capture file format and replay backend for the F5 SVPN cleanup, so it can be profiled and regression tested
+on any platform against real world routing tables.
+
+A capture is a small versioned binary file, everything little endian
+
+- header : magic 'SVPNCAP\\0', format version (uint16), flags (uint16), reserved (uint32), creation time (double)
+- records, back to back : kind (uint8), flags (uint8), key length (uint16), payload length (uint32), timestamp (double)
+  then the key (utf-8) and the payload
+
+Record kinds
+- RT_DUMP  : a raw NET_RT_DUMP blob
+- RT_MSG   : one message read from the AF_ROUTE socket
+- SC_VALUE : a SCDynamicStore value as a binary plist, the key being the SC key, flag ABSENT when there was no value
+- IF_NAME  : an interface of the captured machine, the key being its name, the payload its index (uint32)
+
+The replay names the interfaces (the iface column, the %scope of link-local IPv6 addresses) from the IF_NAME records,
+never from the machine it runs on, so its output is the same everywhere. Version 1 captures have no IF_NAME records,
+their interfaces are shown by index.
+
+The reader maps the file and hands payloads out as memoryview slices of the mapping, the replay feeds them to the same
+decision code the cleanup uses (svpnPolicy, routeMonitor) with no syscall involved.
+
+	python3 svpnCapture.py info capture.svpn
+	python3 svpnCapture.py replay capture.svpn [repeat]
+"""
+import mmap, plistlib, socket, struct, sys, time
+from typing import Iterable, Iterator, NamedTuple
+from routeMonitor import routeMonitor, replay
+from scStore import SNAPSHOT_KEYS, memoryStoreBackend, scSnapshot
+from svpnPolicy import leftoverRoutes, f5ConfigKeys, interfacesToReset
+
+CAPTURE_MAGIC = b'SVPNCAP\0'
+CAPTURE_VERSION = 2
+CAPTURE_HEADER = struct.Struct('<8sHHId')
+RECORD_HEADER = struct.Struct('<BBHId')
+IF_INDEX = struct.Struct('<I')
+
+RT_DUMP = 1
+RT_MSG = 2
+SC_VALUE = 3
+IF_NAME = 4
+RECORD_KINDS = { RT_DUMP: 'RT_DUMP', RT_MSG: 'RT_MSG', SC_VALUE: 'SC_VALUE', IF_NAME: 'IF_NAME' }
+
+# record flags
+ABSENT = 0x1
+
+class captureRecord(NamedTuple):
+	kind: int
+	flags: int
+	timestamp: float
+	key: str
+	payload: memoryview
+
+def plistValue(value):
+	# PyObjC containers (NSDictionary, NSArray, NSData ...) turned into plain python values plistlib can write
+	if isinstance(value, ( str, bool, int, float, bytes )):
+		return value
+	if hasattr(value, 'keys'):
+		return { str(k): plistValue(value[k]) for k in value.keys() }
+	if isinstance(value, ( list, tuple )) or hasattr(value, '__iter__'):
+		return [plistValue(v) for v in value]
+	return bytes(value)
+
+class captureWriter:
+	def __init__(self, path: str):
+		self.file = open(path, 'wb')
+		self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 0, 0, time.time()))
+	def __enter__(self) -> 'captureWriter':
+		return self
+	def __exit__(self, *exc) -> None:
+		self.close()
+	def close(self) -> None:
+		self.file.close()
+	def record(self, kind: int, payload, key: str = '', flags: int = 0) -> None:
+		key = key.encode('utf-8')
+		payload = memoryview(payload).cast('B')
+		self.file.write(RECORD_HEADER.pack(kind, flags, len(key), len(payload), time.time()))
+		self.file.write(key)
+		self.file.write(payload)
+	def routeDump(self, buf, size: int = None) -> None:
+		view = memoryview(buf).cast('B')
+		self.record(RT_DUMP, view if size is None else view[:size])
+	def routeMessage(self, message: bytes) -> None:
+		self.record(RT_MSG, message)
+	def scValue(self, key: str, value) -> None:
+		if value is None:
+			self.record(SC_VALUE, b'', key, ABSENT)
+		else:
+			self.record(SC_VALUE, plistlib.dumps(plistValue(value), fmt=plistlib.FMT_BINARY), key)
+	def interfaces(self, nameindex: Iterable[tuple] = None) -> None:
+		# ( index, name ) pairs, the interfaces of this machine by default
+		for index, name in socket.if_nameindex() if nameindex is None else nameindex:
+			self.record(IF_NAME, IF_INDEX.pack(index), name)
+	def scSnapshot(self, snapshot: scSnapshot, keys: Iterable[str] = SNAPSHOT_KEYS) -> None:
+		# everything the snapshot fetched, plus the explicitly requested keys which were not there
+		for key, value in snapshot.values.items():
+			self.scValue(key, value)
+		for key in keys:
+			if key not in snapshot.values:
+				self.scValue(key, None)
+
+class captureReader:
+	def __init__(self, path: str):
+		with open(path, 'rb') as f:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		self.view = memoryview(self.map)
+		if len(self.view) < CAPTURE_HEADER.size:
+			raise ValueError(f'{path} is not a SVPN capture')
+		magic, self.version, self.flags, _, self.created = CAPTURE_HEADER.unpack_from(self.view)
+		if magic != CAPTURE_MAGIC:
+			raise ValueError(f'{path} is not a SVPN capture')
+		if self.version > CAPTURE_VERSION:
+			raise ValueError(f'{path} is a version {self.version} capture, only up to version {CAPTURE_VERSION} is supported')
+	def __iter__(self) -> Iterator[captureRecord]:
+		idx = CAPTURE_HEADER.size
+		end = len(self.view)
+		while idx + RECORD_HEADER.size <= end:
+			kind, flags, key_len, payload_len, timestamp = RECORD_HEADER.unpack_from(self.view, idx)
+			idx += RECORD_HEADER.size
+			key = bytes(self.view[idx:idx + key_len]).decode('utf-8')
+			idx += key_len
+			if idx + payload_len > end:
+				# truncated capture, the process got killed while recording
+				break
+			yield captureRecord(kind, flags, timestamp, key, self.view[idx:idx + payload_len])
+			idx += payload_len
+
+class captureReplay:
+	# stands in for the live system : NET_RT_DUMP, the routing socket and the SCDynamicStore
+	def __init__(self, reader: captureReader):
+		self.dumps = []
+		self.messages = []
+		self.values = {}
+		# interface index -> name on the captured machine
+		self.names = {}
+		for record in reader:
+			if record.kind == RT_DUMP:
+				self.dumps.append(record.payload)
+			elif record.kind == RT_MSG:
+				self.messages.append(record.payload)
+			elif record.kind == SC_VALUE:
+				self.values[record.key] = None if record.flags & ABSENT else plistlib.loads(bytes(record.payload))
+			elif record.kind == IF_NAME:
+				self.names[IF_INDEX.unpack(record.payload)[0]] = record.key
+	def interfaceName(self, index: int) -> str:
+		# '' for an interface the capture does not know, like routeSockaddr.interfaceName
+		return self.names.get(index, '')
+	def routeDump(self, n: int = 0) -> tuple[memoryview, int]:
+		return ( self.dumps[n], len(self.dumps[n]) )
+	def scSnapshot(self) -> scSnapshot:
+		# through the same copyMultiple call the live cleanup makes
+		return scSnapshot.fetch(memoryStoreBackend(self.values))
+	def plan(self) -> dict:
+		# everything the cleanup would do on the captured machine
+		rt_deletes = leftoverRoutes(*self.routeDump()) if self.dumps else []
+		snapshot = self.scSnapshot()
+		monitor_events = []
+		if self.dumps and self.messages:
+			monitor = routeMonitor.seed(None, *self.routeDump())
+			monitor_events = replay(self.messages, monitor)
+		return {
+			'routes': [rt_entry.describe(self.interfaceName) for rt_entry in rt_deletes],
+			'sc_keys': f5ConfigKeys(snapshot),
+			'interfaces': interfacesToReset(snapshot),
+			'monitor': [f'{event.kind} {event.entry.describe(self.interfaceName)}' for event in monitor_events]
+		}
+
+def main(argv):
+	if len(argv) not in ( 3, 4 ) or argv[1] not in ( 'info', 'replay' ):
+		sys.exit('usage: {0} info|replay captureFile [repeat]'.format(argv[0]))
+	reader = captureReader(argv[2])
+	if argv[1] == 'info':
+		print(f'version {reader.version}, captured {time.ctime(reader.created)}')
+		for record in reader:
+			print(f'{record.timestamp:.6f} {RECORD_KINDS.get(record.kind, record.kind)} {record.key} {len(record.payload)} bytes')
+		return
+	replayed = captureReplay(reader)
+	repeat = int(argv[3]) if len(argv) == 4 else 1
+	start = time.perf_counter()
+	for _ in range(repeat):
+		plan = replayed.plan()
+	elapsed = (time.perf_counter() - start) / repeat
+	for section, items in plan.items():
+		for item in items:
+			print(f'{section}: {item}')
+	dump_size = len(replayed.dumps[0]) if replayed.dumps else 0
+	print(f'{elapsed * 1000:.3f} ms per replay, {dump_size} dump bytes, {len(replayed.messages)} routing messages')
+
+if __name__ == '__main__':
+    main(sys.argv)
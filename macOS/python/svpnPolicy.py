@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+What the F5 SVPN cleanup considers broken, shared by the one shot cleanup, the monitor mode and the capture replay.
+
+Routes :
+- host routes through a gateway are left alone
+- gateway routes which are not global (no RTF_GLOBAL) are the ones SVPN leaves behind
+- any route to or via 1.1.1.1, SVPN points its DNS there
+
+SystemConfiguration :
+- the F5NetworksServicePPP IPv4 and DNS service states are deleted
+- active interfaces with an IPv4 state get reset
+
+SystemConfiguration values are read from a scSnapshot, so a live SCDynamicStore and recorded values
+go through the exact same decisions.
+"""
+from typing import Iterable
+from routeDump import RTF, routeRecord, iterRouteDump
+from routeFlags import flagRule
+from routeTable import routeEntry, entryFromRecord
+from scStore import F5APP_IPV4_CONFSTR, F5APP_DNS_CONFSTR, scSnapshot
+
+HOST_GATEWAY_RULE = flagRule(RTF.HOST | RTF.GATEWAY)
+SVPN_GATEWAY_RULE = flagRule(RTF.GATEWAY, RTF.GLOBAL)
+SVPN_DNS_ADDRESS = '1.1.1.1'
+
+def isSvpnLeftover(rt_entry: routeEntry) -> bool:
+	if HOST_GATEWAY_RULE.match(rt_entry.flags):
+		return False
+	if SVPN_GATEWAY_RULE.match(rt_entry.flags):
+		return True
+	return rt_entry.gateway == SVPN_DNS_ADDRESS or rt_entry.destination == SVPN_DNS_ADDRESS
+
+def leftoverRoutes(buf, size: int = None) -> list:
+	return leftoverEntries(iterRouteDump(buf, size))
+
+def leftoverEntries(records: Iterable[routeRecord]) -> list:
+	rt_deletes = []
+	for rt_route in records:
+		# cheapest test first, these are skipped before any sockaddr gets decoded
+		if HOST_GATEWAY_RULE.match(rt_route.flags):
+			continue
+		rt_entry = entryFromRecord(rt_route)
+		if rt_entry is not None and isSvpnLeftover(rt_entry):
+			rt_deletes.append(rt_entry)
+	return rt_deletes
+
+def f5ConfigKeys(snapshot: scSnapshot) -> list:
+	return [key for key in ( F5APP_IPV4_CONFSTR, F5APP_DNS_CONFSTR ) if snapshot.copyValue(key)]
+
+def interfacesToReset(snapshot: scSnapshot) -> list:
+	iface_name_list = []
+	for i, states in snapshot.interfaces().items():
+		link_state = states.get('Link')
+		if link_state and link_state['Active'] and states.get('IPv4') is not None:
+			iface_name_list.append(i)
+	return iface_name_list
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Check only probe for the F5 SVPN cleanup, answers 'is anything broken ?' in a few milliseconds on a healthy machine.
+
+The cheap signals are looked at first
+- the F5NetworksServicePPP IPv4 and DNS service states, a single configd round-trip for both keys
+- the hosts file backup SVPN leaves behind
+- the routes the kernel picks for the default route and for 1.1.1.1, asked with RTM_GET on the routing socket
+  instead of dumping and parsing the whole table
+
+Only when one of them trips is the full NET_RT_DUMP parsed, for the complete list of leftover routes.
+
+The exit status is meant for scripts : PROBE_CLEAN, PROBE_BROKEN or PROBE_ERROR.
+"""
+import ctypes, errno, os, select, socket, time
+from typing import Callable, Iterable, NamedTuple
+from routeDump import RTF, RTM, RTA, AF, RT_MSGHDR, RT_MSGHDR_SIZE, RTM_VERSION, sockaddr_in, sockaddr_in6, in_addr, iterRouteDump
+from routeDelete import RT_MSG_MAXLEN
+from routeTable import entryFromRecord, parseAddress
+from scStore import F5APP_IPV4_CONFSTR, F5APP_DNS_CONFSTR, scStoreBackend, scSnapshot
+from svpnPolicy import SVPN_DNS_ADDRESS, isSvpnLeftover, leftoverRoutes, f5ConfigKeys
+
+PROBE_CLEAN = 0
+PROBE_BROKEN = 1
+# 2 is taken by argparse usage errors
+PROBE_ERROR = 3
+
+PROBE_KEYS = [F5APP_IPV4_CONFSTR, F5APP_DNS_CONFSTR]
+PROBE_ADDRESSES = ['0.0.0.0', SVPN_DNS_ADDRESS]
+# what route(8) sets on its RTM_GET requests
+RTM_GET_FLAGS = RTF.UP | RTF.GATEWAY.value | RTF.STATIC.value
+
+class probeResult(NamedTuple):
+	status: int
+	# the signals which tripped, 'sc:<key>', 'hosts:<path>', 'route:<address>' or 'noreply:<address>'
+	signals: list
+	# the leftover routes, only when the full parse ran
+	routes: list
+
+def getMessage(address: str, seq: int, pid: int) -> bytes:
+	family, addr = parseAddress(address)
+	if family == AF.INET:
+		sa = sockaddr_in(ctypes.sizeof(sockaddr_in), AF.INET, 0, in_addr(int.from_bytes(addr, 'big')))
+	else:
+		sa = sockaddr_in6(ctypes.sizeof(sockaddr_in6), AF.INET6)
+		sa.sin6_addr.s6_addr[:] = addr
+	rtmsg = bytearray(RT_MSGHDR_SIZE) + bytes(sa)
+	RT_MSGHDR.pack_into(rtmsg, 0, len(rtmsg), RTM_VERSION, RTM.GET, 0, RTM_GET_FLAGS, RTA.DST, pid, seq, 0, 0, 0)
+	return bytes(rtmsg)
+
+class routeLookup:
+	# RTM_GET requests, all written back to back, the kernel answers with the route it would use for each address
+	def __init__(self, rt_sock: socket.socket, timeout: float = .2, seq: int = 1, pid: int = None):
+		self.rt_sock = rt_sock
+		self.timeout = timeout
+		self.seq = seq
+		self.pid = os.getpid() if pid is None else pid
+	def get(self, addresses: Iterable[str]) -> dict:
+		# address -> routeEntry, None when there is no route, addresses missing from the result got no reply in time
+		inflight = {}
+		routes = {}
+		for address in addresses:
+			try:
+				self.rt_sock.send(getMessage(address, self.seq, self.pid))
+			except OSError as e:
+				if e.errno != errno.ESRCH:
+					raise
+				routes[address] = None
+			else:
+				inflight[self.seq] = address
+			self.seq += 1
+		# one deadline for every reply, foreign messages do not push it back
+		deadline = time.monotonic() + self.timeout
+		while inflight:
+			readable, _, _ = select.select([self.rt_sock], [], [], max(0, deadline - time.monotonic()))
+			if not readable:
+				break
+			for rt_reply in iterRouteDump(self.rt_sock.recv(RT_MSG_MAXLEN)):
+				if rt_reply.type != RTM.GET or rt_reply.pid != self.pid or rt_reply.seq not in inflight:
+					continue
+				address = inflight.pop(rt_reply.seq)
+				routes[address] = entryFromRecord(rt_reply) if rt_reply.errno == 0 else None
+			if time.monotonic() >= deadline:
+				break
+		return routes
+
+def probeSignals(snapshot: scSnapshot, hosts_backup_path: str, routes: dict, addresses: Iterable[str] = PROBE_ADDRESSES) -> list:
+	signals = [f'sc:{key}' for key in f5ConfigKeys(snapshot)]
+	if os.path.exists(hosts_backup_path):
+		signals.append(f'hosts:{hosts_backup_path}')
+	for address in addresses:
+		if address not in routes:
+			signals.append(f'noreply:{address}')
+		elif routes[address] is not None and isSvpnLeftover(routes[address]):
+			signals.append(f'route:{address}')
+	return signals
+
+def probe(backend: scStoreBackend, hosts_backup_path: str, lookup: routeLookup, dump: Callable) -> probeResult:
+	# dump() returns a NET_RT_DUMP ( buffer, size ), it is only called when a signal tripped
+	signals = probeSignals(scSnapshot.fetch(backend, PROBE_KEYS, []), hosts_backup_path, lookup.get(PROBE_ADDRESSES))
+	if not signals:
+		return probeResult(PROBE_CLEAN, signals, [])
+	routes = leftoverRoutes(*dump())
+	# a lookup which got no answer is not a problem by itself, the full parse tells
+	broken = routes or any(not signal.startswith('noreply:') for signal in signals)
+	return probeResult(PROBE_BROKEN if broken else PROBE_CLEAN, signals, routes)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Phase timing and counters for the F5 SVPN cleanup, reported as JSON so runs can be aggregated across machines.
+
+- phases : wall time in seconds per cleanup phase, measured with `with stats.phase('parse'):`
+- counters : routes scanned, routes deleted, bytes parsed ...
+- syscalls : per call, counted by wrapping the objects issuing them (routing socket, SC store backend, ioctl backend)
+  with countedCalls, the calls keep going to the wrapped object unchanged
+
+The report is a single JSON object
+	{ "version": 1, "started": <unix time>, "total": <seconds>, "phases": {...}, "counters": {...}, "syscalls": {...} }
+"""
+import json, sys, time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+STATS_VERSION = 1
+
+class cleanupStats:
+	def __init__(self):
+		self.started = time.time()
+		self.start = time.perf_counter()
+		# insertion ordered, phases show up in the order they ran
+		self.phases = {}
+		self.counters = {}
+		self.syscalls = {}
+	@contextmanager
+	def phase(self, name: str) -> Iterator[None]:
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.phases[name] = self.phases.get(name, 0.) + time.perf_counter() - start
+	def count(self, name: str, n: int = 1) -> None:
+		self.counters[name] = self.counters.get(name, 0) + n
+	def syscall(self, name: str, n: int = 1) -> None:
+		self.syscalls[name] = self.syscalls.get(name, 0) + n
+	def counting(self, name: str, items: Iterable) -> Iterator:
+		# passes items through, counting them as they are consumed
+		for item in items:
+			self.counters[name] = self.counters.get(name, 0) + 1
+			yield item
+	def report(self) -> dict:
+		return {
+			'version': STATS_VERSION,
+			'started': self.started,
+			'total': time.perf_counter() - self.start,
+			'phases': dict(self.phases),
+			'counters': dict(self.counters),
+			'syscalls': dict(self.syscalls)
+		}
+	def write(self, path: str) -> None:
+		# '-' for stdout, one line so it can be picked out of the progress output
+		report = json.dumps(self.report(), separators=(',', ':'))
+		if path == '-':
+			print(report)
+			sys.stdout.flush()
+		else:
+			with open(path, 'w') as f:
+				f.write(report + '\n')
+
+class countedCalls:
+	# proxy counting calls to some methods of the wrapped object, stats.syscalls[method name mapped in calls] += 1
+	def __init__(self, target, stats: cleanupStats, calls: dict):
+		# calls : method name -> syscall name, e.g. { 'getFlags': 'ioctl', 'setFlags': 'ioctl' }
+		self._target = target
+		self._stats = stats
+		self._calls = calls
+	def __getattr__(self, name: str):
+		attr = getattr(self._target, name)
+		if name not in self._calls:
+			return attr
+		syscall = self._calls[name]
+		def counted(*args, **kwargs):
+			self._stats.syscall(syscall)
+			return attr(*args, **kwargs)
+		return counted